@@ -1,72 +1,220 @@
 #!/usr/bin/env python3
-"""Generate Portfolio_AI_Agent_Guide.docx with professional formatting."""
+"""Generate Portfolio_AI_Agent_Guide.docx with professional formatting.
+
+The styling helpers and DocxTemplate are also used for bulk per-client
+documents; run with --bench [N] to measure documents per second.
+"""
+
+import copy
+import functools
+import io
+import os
+import sys
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 
 from docx import Document
 from docx.shared import Inches, Pt, Cm, RGBColor
+from docx.enum.style import WD_STYLE_TYPE
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.enum.table import WD_TABLE_ALIGNMENT
+from docx.oxml import OxmlElement
 from docx.oxml.ns import qn
+from docx.table import Table
+from docx.text.run import Run
 
 
-def set_cell_shading(cell, color_hex):
-    """Set background color on a table cell."""
-    shading = cell._element.get_or_add_tcPr()
-    shd = shading.makeelement(qn("w:shd"), {
+@functools.lru_cache(maxsize=None)
+def _shading(color_hex):
+    """Prebuilt w:shd element for a fill color — deep-copied, never rebuilt."""
+    return OxmlElement("w:shd", {
         qn("w:val"): "clear",
         qn("w:color"): "auto",
         qn("w:fill"): color_hex,
     })
-    shading.append(shd)
+
+
+def _set_shading(props, color_hex):
+    """Replace any existing w:shd on a pPr/tcPr with the cached one."""
+    for old in props.findall(qn("w:shd")):
+        props.remove(old)
+    props.append(copy.deepcopy(_shading(color_hex)))
+
+
+def set_cell_shading(cell, color_hex):
+    """Set background color on a table cell."""
+    _set_shading(cell._element.get_or_add_tcPr(), color_hex)
+
+
+def add_styles(doc):
+    """Define the shared named styles once, so content only references them."""
+    styles = doc.styles
+
+    style = styles["Normal"]
+    style.font.name = "Calibri"
+    style.font.size = Pt(11)
+    style.paragraph_format.space_after = Pt(6)
+
+    code = styles.add_style("Code Block", WD_STYLE_TYPE.PARAGRAPH)
+    code.base_style = styles["Normal"]
+    code.paragraph_format.space_before = Pt(4)
+    code.paragraph_format.space_after = Pt(4)
+    code.paragraph_format.left_indent = Cm(1)
+    code.font.name = "Courier New"
+    code.font.size = Pt(9)
+    code.font.color.rgb = RGBColor(0x1E, 0x1E, 0x1E)
+    _set_shading(code.element.get_or_add_pPr(), "F0F0F0")
+
+    tip = styles.add_style("Tip", WD_STYLE_TYPE.PARAGRAPH)
+    tip.base_style = styles["Normal"]
+    tip.paragraph_format.left_indent = Cm(1)
+    tip.font.size = Pt(10)
+    tip.font.color.rgb = RGBColor(0x33, 0x33, 0x33)
+    _set_shading(tip.element.get_or_add_pPr(), "E8F4FD")
+
+    label = styles.add_style("Tip Label", WD_STYLE_TYPE.CHARACTER)
+    label.font.bold = True
+    label.font.color.rgb = RGBColor(0x0A, 0x6E, 0xBD)
+
+
+# Document part → its template's {style name: style id}. python-docx resolves
+# names by scanning styles.xml on every assignment; ids go straight into the XML.
+_style_ids = weakref.WeakKeyDictionary()
+
+
+def set_style(obj, name):
+    """Apply a named style to a paragraph, run or table via its cached style id.
+
+    Documents from DocxTemplate.new() use their own template's ids; any
+    other document falls back to python-docx's lookup by name.
+    """
+    style_id = _style_ids.get(obj.part, {}).get(name)
+    if style_id is None:
+        obj.style = name
+    elif isinstance(obj, Table):
+        obj._tbl.tblStyle_val = style_id
+    elif isinstance(obj, Run):
+        obj._r.style = style_id
+    else:
+        obj._p.style = style_id
 
 
 def add_code_block(doc, code, language=""):
     """Add a styled code block paragraph."""
-    p = doc.add_paragraph()
-    p.paragraph_format.space_before = Pt(4)
-    p.paragraph_format.space_after = Pt(4)
-    p.paragraph_format.left_indent = Cm(1)
-    run = p.add_run(code)
-    run.font.name = "Courier New"
-    run.font.size = Pt(9)
-    run.font.color.rgb = RGBColor(0x1E, 0x1E, 0x1E)
-    # Light gray background via shading on paragraph
-    pPr = p._element.get_or_add_pPr()
-    shd = pPr.makeelement(qn("w:shd"), {
-        qn("w:val"): "clear",
-        qn("w:color"): "auto",
-        qn("w:fill"): "F0F0F0",
-    })
-    pPr.append(shd)
+    set_style(doc.add_paragraph(code), "Code Block")
 
 
 def add_tip(doc, text):
     """Add a tip/note callout."""
     p = doc.add_paragraph()
-    p.paragraph_format.left_indent = Cm(1)
-    pPr = p._element.get_or_add_pPr()
-    shd = pPr.makeelement(qn("w:shd"), {
-        qn("w:val"): "clear",
-        qn("w:color"): "auto",
-        qn("w:fill"): "E8F4FD",
-    })
-    pPr.append(shd)
-    run = p.add_run("Tip: ")
-    run.bold = True
-    run.font.size = Pt(10)
-    run.font.color.rgb = RGBColor(0x0A, 0x6E, 0xBD)
-    run = p.add_run(text)
-    run.font.size = Pt(10)
-    run.font.color.rgb = RGBColor(0x33, 0x33, 0x33)
+    set_style(p, "Tip")
+    set_style(p.add_run("Tip: "), "Tip Label")
+    p.add_run(text)
 
 
-def build():
-    doc = Document()
+# ═══════════════════════════════════════════════════════════════════════════
+# TEMPLATES — bulk generation from a pre-styled base document
+# ═══════════════════════════════════════════════════════════════════════════
 
-    # -- Default font --
-    style = doc.styles["Normal"]
-    style.font.name = "Calibri"
-    style.font.size = Pt(11)
-    style.paragraph_format.space_after = Pt(6)
+class DocxTemplate:
+    """A pre-styled base .docx loaded once and cloned per document.
+
+    Pass the path of an existing styled .docx, or nothing to build the base
+    from add_styles(). Cloning re-opens the serialized package from memory,
+    so no per-document style setup or disk reads happen; style ids are
+    resolved once per template and used by set_style() on its documents.
+    """
+
+    def __init__(self, base=None):
+        if base is None:
+            doc = Document()
+            add_styles(doc)
+            buf = io.BytesIO()
+            doc.save(buf)
+            base = buf.getvalue()
+        elif not isinstance(base, bytes):
+            base = Path(base).read_bytes()
+        self.base = base
+        self.style_ids = {style.name: style.style_id for style in Document(io.BytesIO(base)).styles}
+
+    def new(self):
+        doc = Document(io.BytesIO(self.base))
+        _style_ids[doc.part] = self.style_ids
+        return doc
+
+
+_worker_template = None
+
+
+def _init_worker(base):
+    global _worker_template
+    _worker_template = DocxTemplate(base)
+
+
+def _render_one(job):
+    render, out_path, payload = job
+    doc = _worker_template.new()
+    render(doc, payload)
+    doc.save(out_path)
+    return out_path
+
+
+def render_many(template, render, jobs, out_dir, workers=None):
+    """Render (name, payload) jobs to out_dir/<name>.docx across a process pool.
+
+    `render(doc, payload)` must be a module-level function so it can be
+    pickled to the workers; each worker clones its own copy of the template.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    work = [(render, str(out_dir / f"{name}.docx"), payload) for name, payload in jobs]
+    if workers == 1:
+        _init_worker(template.base)
+        return [_render_one(job) for job in work]
+    workers = workers or os.cpu_count()
+    chunksize = max(1, len(work) // (workers * 4))
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(template.base,)) as pool:
+        return list(pool.map(_render_one, work, chunksize=chunksize))
+
+
+def _sample_client_report(doc, payload):
+    """Small per-client document used by benchmark()."""
+    doc.add_heading(f"Portfolio Summary — {payload['client']}", level=1)
+    table = doc.add_table(rows=len(payload["rows"]) + 1, cols=3)
+    set_style(table, "Light Grid Accent 1")
+    rows = table.rows
+    for cell, h in zip(rows[0].cells, ("Ticker", "Value", "Weight")):
+        cell.text = h
+        set_cell_shading(cell, "D9E2F3")
+    for row, (ticker, value, weight) in zip(rows[1:], payload["rows"]):
+        cells = row.cells
+        cells[0].text = ticker
+        cells[1].text = f"${value:,.2f}"
+        cells[2].text = f"{weight:.1f}%"
+    add_tip(doc, "Rebalance when any position drifts more than 5% from target.")
+    add_code_block(doc, "python3 portfolio_agent.py")
+
+
+def benchmark(n=1000, workers=None):
+    """Print documents/second for n sample reports, serial and pooled."""
+    import tempfile
+
+    template = DocxTemplate()
+    rows = [("FXAIX", 3945.09, 14.2), ("QQQM", 2227.84, 8.0), ("SPY", 11686.14, 42.0),
+            ("FSMDX", 1423.93, 5.1), ("BTC", 4179.19, 15.0)]
+    jobs = [(f"client_{i:05d}", {"client": f"Client {i}", "rows": rows}) for i in range(n)]
+    with tempfile.TemporaryDirectory() as out_dir:
+        for label, w in (("serial", 1), ("pool", workers)):
+            start = time.perf_counter()
+            render_many(template, _sample_client_report, jobs, out_dir, workers=w)
+            elapsed = time.perf_counter() - start
+            print(f"  {label:<7} {n} docs in {elapsed:.2f}s → {n / elapsed:,.0f} docs/sec")
+
+
+def build():
+    doc = DocxTemplate().new()
 
     # -- Title --
     title = doc.add_heading("Portfolio AI Agent — Setup Guide", level=0)
@@ -172,7 +320,7 @@ def build():
 
     # Fields table
     table = doc.add_table(rows=6, cols=3)
-    table.style = "Light Grid Accent 1"
+    set_style(table, "Light Grid Accent 1")
     table.alignment = WD_TABLE_ALIGNMENT.CENTER
     headers = ["Field", "Type", "Description"]
     for i, h in enumerate(headers):
@@ -400,7 +548,7 @@ def build():
     doc.add_heading("9. Costs", level=1)
 
     cost_table = doc.add_table(rows=4, cols=3)
-    cost_table.style = "Light Grid Accent 1"
+    set_style(cost_table, "Light Grid Accent 1")
     cost_table.alignment = WD_TABLE_ALIGNMENT.CENTER
     cost_headers = ["Component", "Cost", "Notes"]
     for i, h in enumerate(cost_headers):
@@ -429,7 +577,7 @@ def build():
     doc.add_heading("10. Troubleshooting", level=1)
 
     trouble_table = doc.add_table(rows=7, cols=2)
-    trouble_table.style = "Light Grid Accent 1"
+    set_style(trouble_table, "Light Grid Accent 1")
     trouble_table.alignment = WD_TABLE_ALIGNMENT.CENTER
     trouble_table.rows[0].cells[0].text = "Problem"
     trouble_table.rows[0].cells[0].paragraphs[0].runs[0].bold = True
@@ -483,4 +631,7 @@ def build():
 
 
 if __name__ == "__main__":
-    build()
+    if len(sys.argv) > 1 and sys.argv[1] == "--bench":
+        benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 1000)
+    else:
+        build()
@@ -8,19 +8,34 @@ for BUY/SELL/HOLD recommendations, and delivers via email/Slack/Notion/file.
 Usage:
     export ANTHROPIC_API_KEY="sk-ant-..."
     python3 portfolio_agent.py
+
+    python3 portfolio_agent.py serve   # local read-only HTTP API
 """
 
 import os
 import sys
 import json
+import math
+import queue
+import time
+import csv
 import datetime
+import functools
+import bisect
+import hashlib
+import re
 import smtplib
+import threading
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
+from urllib.parse import urlsplit
+from zoneinfo import ZoneInfo
 
 try:
     import yfinance as yf
+    import numpy as np  # installed with yfinance
 except ImportError:
     sys.exit("Missing dependency: pip install yfinance")
 
@@ -39,6 +54,13 @@ SEND_EMAIL = False
 SEND_SLACK = False
 POST_NOTION = False
 SAVE_LOCAL = True  # always saves a markdown file next to this script
+SAVE_DOCX = False  # also save a .docx report with charts (pip install python-docx matplotlib)
+
+# "delta" sends email/Slack/Notion only what changed since the last run (the
+# full report is still saved locally and attached to emails); "full" sends everything.
+DELIVERY_MODE = "delta"
+DELTA_VALUE_MOVE_PCT = 3.0    # flag positions whose value moved more than this %
+DELTA_WEIGHT_DRIFT_PP = 1.0   # flag weight changes bigger than this many points
 
 # ── Email (Gmail example — use an App Password, not your real password) ──
 EMAIL_FROM = ""
@@ -61,6 +83,12 @@ NOTION_DATABASE_ID = ""
 #
 # Format: "TICKER": {shares, avg_cost, account}
 # Add "yf_ticker" if Yahoo Finance uses a different symbol than what you see.
+# Add "cadence" ("intraday", "nav" or "money_market") to override how often
+# the fetch planner expects a new price — see instrument_cadence().
+# Add "risk_proxy" to use a longer-history symbol for risk/stress tests.
+# Add "accounts": {"Roth IRA": 10.0, "Taxable": 7.4} to give the per-account
+# share split for rebalancing; otherwise shares are split evenly across the
+# accounts named in "account" and sales from that guess are marked "estimated".
 PORTFOLIO = {
     "FXAIX": {
         "shares": 16.915,
@@ -71,6 +99,7 @@ PORTFOLIO = {
         "shares": 9.144,
         "avg_cost": 243.64,
         "account": "Roth IRA + Taxable",
+        "risk_proxy": "QQQ",  # QQQM launched Oct 2020
     },
     "SPY": {
         "shares": 17.442,
@@ -92,6 +121,7 @@ PORTFOLIO = {
         "avg_cost": 33.26,
         "account": "Taxable",
         "name": "Grayscale Bitcoin Mini Trust ETF",
+        "risk_proxy": "BTC-USD",  # spot history back to 2014
     },
     "FCNTX": {
         "shares": 16.227,
@@ -108,36 +138,712 @@ PORTFOLIO = {
 
 # ── Recurring investments (DCA context for Claude) ──
 RECURRING = [
-    {"ticker": "BTC",   "amount": 300,    "frequency": "biweekly", "note": "Taxable brokerage"},
-    {"ticker": "SPY",   "amount": 400,    "frequency": "biweekly", "note": "Taxable brokerage"},
-    {"ticker": "FCNTX", "amount": 400,    "frequency": "biweekly", "note": "Taxable brokerage"},
-    {"ticker": "FXAIX", "amount": 432.34, "frequency": "biweekly + monthly", "note": "401k (base $104.74 biweekly + commission $327.60 monthly)"},
-    {"ticker": "FSPGX", "amount": 319.26, "frequency": "biweekly + monthly", "note": "401k (base $77.34 biweekly + commission $241.92 monthly)"},
-    {"ticker": "FSMDX", "amount": 198.59, "frequency": "biweekly + monthly", "note": "401k (base $48.11 biweekly + commission $150.48 monthly)"},
+    {"ticker": "BTC",   "amount": 300,    "frequency": "biweekly", "account": "Taxable", "note": "Taxable brokerage"},
+    {"ticker": "SPY",   "amount": 400,    "frequency": "biweekly", "account": "Taxable", "note": "Taxable brokerage"},
+    {"ticker": "FCNTX", "amount": 400,    "frequency": "biweekly", "account": "Taxable", "note": "Taxable brokerage"},
+    {"ticker": "FXAIX", "amount": 432.34, "frequency": "biweekly + monthly", "account": "401k", "note": "401k (base $104.74 biweekly + commission $327.60 monthly)"},
+    {"ticker": "FSPGX", "amount": 319.26, "frequency": "biweekly + monthly", "account": "401k", "note": "401k (base $77.34 biweekly + commission $241.92 monthly)"},
+    {"ticker": "FSMDX", "amount": 198.59, "frequency": "biweekly + monthly", "account": "401k", "note": "401k (base $48.11 biweekly + commission $150.48 monthly)"},
 ]
 
 # Claude model — change to "claude-opus-4-6" for deeper analysis
 CLAUDE_MODEL = "claude-sonnet-4-6"
 
+# ── Local cache (last market snapshot etc.) ──
+CACHE_DIR = Path(__file__).parent / "cache"
+
+# Long price histories (risk engine etc.) — memory-mapped float32 closes
+PRICE_STORE_DIR = CACHE_DIR / "prices"
+PRICE_STORE_START = datetime.date(1990, 1, 2)
+PRICE_STORE_ADJ_TOLERANCE = 1e-4  # relative change in a stored close that means Yahoo re-adjusted history
+
+# Mutual fund NAVs post a while after the 4 PM close — don't refetch before this.
+NAV_PUBLISH_DELAY = datetime.timedelta(hours=2)
+
+# Analyst targets / ratings change slowly — refresh them on their own schedule
+# and never make the daily price fetch wait more than a few seconds on them.
+FUNDAMENTALS_MAX_AGE = datetime.timedelta(days=7)
+FUNDAMENTALS_RETRY_AFTER = datetime.timedelta(days=1)  # after a failed fetch
+FUNDAMENTALS_WAIT_SECONDS = 5
+
+# ── Market-data tail latency ──
+MARKET_DATA_TIMEOUT = 15    # seconds before a symbol falls back to its cached value
+HEDGE_DEFAULT_DELAY = 2.0   # hedge delay until a symbol has enough latency samples
+HEDGE_MIN_DELAY = 0.25
+BREAKER_THRESHOLD = 3       # consecutive errors before an endpoint is skipped
+BREAKER_COOLDOWN = 60       # seconds before a tripped endpoint is retried
+
+# ── Risk engine (VaR / CVaR / stress tests added to the summary) ──
+RISK_ANALYSIS = True
+RISK_HORIZONS = (1, 10, 21)      # trading days
+RISK_CONFIDENCE = (0.95, 0.99)
+RISK_LOOKBACK_DAYS = 2520        # ~10 years of daily returns
+RISK_BOOTSTRAP_PATHS = 10_000
+# Replay a historical window ("start"/"end") or apply % shocks per ticker
+# ("*" = every non-cash position not listed).
+STRESS_SCENARIOS = [
+    {"name": "COVID crash (Feb-Mar 2020)", "start": "2020-02-19", "end": "2020-03-23"},
+    {"name": "2022 bear market", "start": "2022-01-03", "end": "2022-10-12"},
+    {"name": "BTC drawdown -50%", "shocks": {"BTC": -50}},
+    {"name": "Equities -20%, BTC -40%", "shocks": {"*": -20, "BTC": -40}},
+]
+
+# ── Fund look-through (overlap / true single-name concentration) ──
+# One CSV per fund named after its ticker, e.g. fund_holdings/SPY.csv, with
+# columns symbol,weight[,sector] (weight in percent). Holdings without a
+# file count as a single security.
+LOOK_THROUGH_DIR = Path(__file__).parent / "fund_holdings"
+LOOK_THROUGH_TOP_N = 10
+
+# ── Target allocation (% of total value) — drift alerts and rebalancing ──
+# e.g. {"FXAIX": 30, "SPY": 20, "QQQM": 10, "FSMDX": 10, "FSPGX": 10, "FCNTX": 10, "BTC": 8, "SPAXX": 2}
+# Tickers left out are never traded.
+TARGET_WEIGHTS = {}
+
+# How each account is taxed — sales go to tax-advantaged accounts first
+ACCOUNT_TAX = {"Roth IRA": "roth", "401k": "tax_deferred", "Taxable": "taxable"}
+REBALANCE_MIN_TRADE = 50  # $ — smaller trades are dropped
+# Without "accounts", a multi-account holding's split is a guess: sales from it
+# are marked "estimated" and capped at this fraction of an even split.
+REBALANCE_ESTIMATED_SHARE = 0.5
+
+# ── Price alerts, checked against every fresh quote ──
+# "ticker" may be "*" to apply a rule to every position. Kinds:
+#   price_above / price_below   "value"  — price crosses a fixed level
+#   gain_above / loss_below     "value"  — gain_pct crosses X% (loss: negative X)
+#   drift_above                 "value"  — |weight_pct - TARGET_WEIGHTS| exceeds X points
+#   target_low / target_high             — price crosses the analyst target
+#   new_52w_low                          — price drops below the last check's 52-week low
+SEND_ALERTS = False
+ALERT_CHANNELS = ("slack",)  # any of "slack", "email"
+ALERT_COOLDOWN_HOURS = 24
+ALERT_RULES = [
+    {"ticker": "*", "kind": "loss_below", "value": -15},
+    {"ticker": "*", "kind": "new_52w_low"},
+    {"ticker": "BTC", "kind": "target_low"},
+]
+
+# ── Local HTTP API (python3 portfolio_agent.py serve) ──
+SERVE_HOST = "127.0.0.1"
+SERVE_PORT = 8765
+SERVE_REFRESH_MINUTES = 15
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# MARKET CALENDAR & FETCH PLANNING
+# ═══════════════════════════════════════════════════════════════════════════
+
+MARKET_TZ = ZoneInfo("America/New_York")
+MARKET_OPEN = datetime.time(9, 30)
+MARKET_CLOSE = datetime.time(16, 0)
+EARLY_CLOSE = datetime.time(13, 0)
+
+
+def _easter(year):
+    """Gregorian Easter Sunday (anonymous computus)."""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    day = ((h + l - 7 * m + 114) % 31) + 1
+    return datetime.date(year, month, day)
+
+
+def _nth_weekday(year, month, weekday, n):
+    """n-th `weekday` (Mon=0) of a month; n=-1 for the last one."""
+    if n > 0:
+        first = datetime.date(year, month, 1)
+        return first + datetime.timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    nxt = datetime.date(year + month // 12, month % 12 + 1, 1)
+    last = nxt - datetime.timedelta(days=1)
+    return last - datetime.timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _observed(day):
+    """Saturday holidays are observed Friday, Sunday holidays Monday."""
+    if day.weekday() == 5:
+        return day - datetime.timedelta(days=1)
+    if day.weekday() == 6:
+        return day + datetime.timedelta(days=1)
+    return day
+
+
+@functools.lru_cache(maxsize=None)
+def market_holidays(year):
+    """NYSE full-day closures for a year."""
+    days = {
+        _nth_weekday(year, 1, 0, 3),                 # MLK Day
+        _nth_weekday(year, 2, 0, 3),                 # Presidents' Day
+        _easter(year) - datetime.timedelta(days=2),  # Good Friday
+        _nth_weekday(year, 5, 0, -1),                # Memorial Day
+        _observed(datetime.date(year, 7, 4)),        # Independence Day
+        _nth_weekday(year, 9, 0, 1),                 # Labor Day
+        _nth_weekday(year, 11, 3, 4),                # Thanksgiving
+        _observed(datetime.date(year, 12, 25)),      # Christmas
+    }
+    # NYSE doesn't close on Dec 31 when New Year's falls on a Saturday
+    new_year = datetime.date(year, 1, 1)
+    if new_year.weekday() != 5:
+        days.add(_observed(new_year))
+    if year >= 2022:
+        days.add(_observed(datetime.date(year, 6, 19)))  # Juneteenth
+    return frozenset(days)
+
+
+def is_trading_day(day):
+    return day.weekday() < 5 and day not in market_holidays(day.year)
+
+
+@functools.lru_cache(maxsize=None)
+def _early_closes(year):
+    """1 PM closes: July 3, the day after Thanksgiving and Christmas Eve."""
+    candidates = (
+        datetime.date(year, 7, 3),
+        _nth_weekday(year, 11, 3, 4) + datetime.timedelta(days=1),
+        datetime.date(year, 12, 24),
+    )
+    return frozenset(d for d in candidates if is_trading_day(d))
+
+
+def session_bounds(day):
+    """(open, close) as aware datetimes for a trading day."""
+    close = EARLY_CLOSE if day in _early_closes(day.year) else MARKET_CLOSE
+    return (
+        datetime.datetime.combine(day, MARKET_OPEN, tzinfo=MARKET_TZ),
+        datetime.datetime.combine(day, close, tzinfo=MARKET_TZ),
+    )
+
+
+def last_close(now):
+    """Most recent session close at or before `now`."""
+    day = now.astimezone(MARKET_TZ).date()
+    while True:
+        if is_trading_day(day):
+            close = session_bounds(day)[1]
+            if close <= now:
+                return close
+        day -= datetime.timedelta(days=1)
+
+
+def instrument_cadence(ticker, holding):
+    """How often an instrument prints a new value: intraday, nav or money_market.
+
+    Inferred unless the holding sets "cadence": cash positions never move,
+    5-letter symbols ending in X are mutual funds (one NAV after the close),
+    everything else trades intraday.
+    """
+    if holding.get("cadence"):
+        return holding["cadence"]
+    if holding.get("skip_analysis"):
+        return "money_market"
+    symbol = holding.get("yf_ticker") or ticker
+    if len(symbol) == 5 and symbol.isalpha() and symbol.upper().endswith("X"):
+        return "nav"
+    return "intraday"
+
+
+def latest_data_time(cadence, now):
+    """Newest moment an instrument with this cadence could have printed a value."""
+    if cadence == "money_market":
+        return None
+    if cadence == "nav":
+        close = last_close(now)
+        while close + NAV_PUBLISH_DELAY > now:
+            close = last_close(close - datetime.timedelta(seconds=1))
+        return close + NAV_PUBLISH_DELAY
+    day = now.astimezone(MARKET_TZ).date()
+    if is_trading_day(day):
+        open_, close = session_bounds(day)
+        if open_ <= now < close:
+            return now
+    return last_close(now)
+
+
+def plan_fetches(now, snapshot):
+    """Return the set of PORTFOLIO tickers that could have new data since the snapshot.
+
+    A ticker with no snapshot entry is always due, whatever its cadence, so
+    a "money_market" override still gets priced once. skip_analysis holdings
+    are valued at avg_cost and never fetched.
+    """
+    due = set()
+    for ticker, holding in PORTFOLIO.items():
+        if holding.get("skip_analysis"):
+            continue
+        entry = snapshot.get(ticker)
+        if entry is None:
+            due.add(ticker)
+            continue
+        latest = latest_data_time(instrument_cadence(ticker, holding), now)
+        if latest is not None and datetime.datetime.fromisoformat(entry["fetched_at"]) < latest:
+            due.add(ticker)
+    return due
+
+
+def load_snapshot():
+    """Last fetched market data per ticker: {ticker: {fetched_at, data}}."""
+    path = CACHE_DIR / "market_snapshot.json"
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def save_snapshot(snapshot):
+    CACHE_DIR.mkdir(exist_ok=True)
+    path = CACHE_DIR / "market_snapshot.json"
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(snapshot, indent=2), encoding="utf-8")
+    tmp.replace(path)
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# PRICE STORE
+# ═══════════════════════════════════════════════════════════════════════════
+
+class PriceStore:
+    """Append-only columnar store of daily closes, memory-mapped on read.
+
+    Layout under PRICE_STORE_DIR:
+      dates.i8     int64 day numbers of every NYSE trading day since
+                   PRICE_STORE_START — the shared row index
+      <SYM>.f4     float32 closes, row i belongs to dates[i]; NaN = no data
+      <SYM>.full   marker: the column holds the symbol's full history
+
+    Files only ever grow, so readers get zero-copy NumPy views straight from
+    the page cache and opening the store costs nothing up front.
+
+    Only finished sessions are stored. Closes are split/dividend adjusted,
+    so a new split or dividend rescales every earlier close; write() spots
+    that as overlapping closes that moved and drops the .full marker, so the
+    next load re-downloads full history.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def _path(self, symbol, suffix=".f4"):
+        return self.root / f"{symbol.replace('/', '_')}{suffix}"
+
+    def _map(self, path, dtype):
+        if not path.exists() or path.stat().st_size == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r")
+
+    def dates(self):
+        """Row index as datetime64[D] (a view over the int64 day numbers)."""
+        return self._map(self.root / "dates.i8", np.int64).view("datetime64[D]")
+
+    def _extend_index(self, until):
+        """Append trading days up to `until` to the date index."""
+        index = self.dates()
+        day = index[-1].item() + datetime.timedelta(days=1) if len(index) else PRICE_STORE_START
+        new = []
+        while day <= until:
+            if is_trading_day(day):
+                new.append(day)
+            day += datetime.timedelta(days=1)
+        if new:
+            self.root.mkdir(parents=True, exist_ok=True)
+            with open(self.root / "dates.i8", "ab") as f:
+                f.write(np.array(new, dtype="datetime64[D]").tobytes())
+
+    def write(self, symbol, dates, closes, through):
+        """Store closes for `dates` (datetime64[D]) up to the session `through`.
+
+        Pass last_close(now).date() as `through`: a bar for a session still
+        in progress (a live intraday price, or BTC's partial daily bar) is
+        not a close and would later look like re-adjusted history.
+        Non-trading days are ignored.
+        """
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        closes = np.asarray(closes, dtype=np.float32)
+        final = dates <= np.datetime64(through, "D")
+        dates, closes = dates[final], closes[final]
+        if not len(dates):
+            return
+        self._extend_index(dates.max().item())
+        index = self.dates()
+        rows = np.searchsorted(index, dates)
+        keep = (rows < len(index)) & (index[np.minimum(rows, len(index) - 1)] == dates)
+        rows, closes = rows[keep], closes[keep]
+        if not len(rows):
+            return
+
+        path = self._path(symbol)
+        length = path.stat().st_size // 4 if path.exists() else 0
+        if rows.max() >= length:
+            with open(path, "ab") as f:
+                f.write(np.full(rows.max() + 1 - length, np.nan, dtype=np.float32).tobytes())
+        column = np.memmap(path, dtype=np.float32, mode="r+")
+        old, new = column[rows], closes
+        both = ~np.isnan(old) & ~np.isnan(new)
+        if both.any() and (np.abs(new[both] / old[both] - 1) > PRICE_STORE_ADJ_TOLERANCE).any():
+            self._path(symbol, ".full").unlink(missing_ok=True)
+        column[rows] = closes
+        column.flush()
+        del column
+
+    def closes(self, symbol, start=None, end=None):
+        """(dates, closes) for start <= date <= end — both zero-copy views."""
+        index = self.dates()
+        column = self._map(self._path(symbol), np.float32)
+        lo = np.searchsorted(index, np.datetime64(start, "D")) if start else 0
+        hi = np.searchsorted(index, np.datetime64(end, "D"), "right") if end else len(column)
+        hi = min(hi, len(column))
+        return index[lo:hi], column[lo:hi]
+
+    def matrix(self, symbols, start=None, end=None):
+        """(dates, closes[date, symbol]) for several symbols, NaN-padded.
+
+        This one copies (into a float32 matrix); for workloads that must stay
+        within a memory budget, iterate closes() per symbol instead.
+        """
+        index = self.dates()
+        lo = np.searchsorted(index, np.datetime64(start, "D")) if start else 0
+        hi = np.searchsorted(index, np.datetime64(end, "D"), "right") if end else len(index)
+        out = np.full((hi - lo, len(symbols)), np.nan, dtype=np.float32)
+        for j, symbol in enumerate(symbols):
+            column = self._map(self._path(symbol), np.float32)[lo:hi]
+            out[:len(column), j] = column
+        return index[lo:hi], out
+
+    def has_full_history(self, symbol):
+        return self._path(symbol, ".full").exists()
+
+    def mark_full_history(self, symbol):
+        self._path(symbol, ".full").touch()
+
+
+PRICE_STORE = PriceStore(PRICE_STORE_DIR)
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# TAIL-LATENCY CONTROL
+# ═══════════════════════════════════════════════════════════════════════════
+
+class CircuitOpen(Exception):
+    """Raised instead of calling an endpoint whose breaker has tripped."""
+
+
+class LatencyHistograms:
+    """Per-key latency histograms in log-spaced buckets, persisted across runs."""
+
+    BASE = 0.05     # upper bound of the first bucket, seconds
+    GROWTH = 1.5
+    MIN_SAMPLES = 10
+
+    def __init__(self, path):
+        self.path = path
+        self.counts = None
+        self.lock = threading.Lock()
+
+    def _load(self):
+        if self.counts is None:
+            try:
+                self.counts = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                self.counts = {}
+        return self.counts
+
+    def record(self, key, seconds):
+        bucket = max(0, math.ceil(math.log(max(seconds, 1e-6) / self.BASE, self.GROWTH)))
+        with self.lock:
+            hist = self._load().setdefault(key, {})
+            hist[str(bucket)] = hist.get(str(bucket), 0) + 1
+
+    def p95(self, key):
+        """95th-percentile latency bound for `key`, or None without enough samples."""
+        with self.lock:
+            hist = self._load().get(key, {})
+            total = sum(hist.values())
+            if total < self.MIN_SAMPLES:
+                return None
+            seen = 0
+            for bucket in sorted(hist, key=int):
+                seen += hist[bucket]
+                if seen >= 0.95 * total:
+                    return self.BASE * self.GROWTH ** int(bucket)
+
+    def save(self):
+        with self.lock:
+            if self.counts is None:
+                return
+            CACHE_DIR.mkdir(exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self.counts), encoding="utf-8")
+            tmp.replace(self.path)
+
+
+class CircuitBreaker:
+    """Skip an endpoint after BREAKER_THRESHOLD consecutive errors, retry after the cooldown."""
+
+    def __init__(self):
+        self.failures = 0
+        self.open_until = 0.0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            return self.failures < BREAKER_THRESHOLD or time.monotonic() >= self.open_until
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= BREAKER_THRESHOLD:
+                self.open_until = time.monotonic() + BREAKER_COOLDOWN
+
+
+LATENCY = LatencyHistograms(CACHE_DIR / "latency.json")
+_breakers = {}
+
+
+def breaker(endpoint):
+    """The circuit breaker for one Yahoo endpoint ("quote", "history", "fundamentals").
+
+    Breakers are per endpoint rather than per host, so background fundamentals
+    failures can never trip the price path.
+    """
+    return _breakers.setdefault(endpoint, CircuitBreaker())
+
+
+def hedged_call(fn, key, endpoint):
+    """Call `fn()` with a hedged duplicate after the key's p95 latency.
+
+    Whichever attempt succeeds first wins. Raises TimeoutError after
+    MARKET_DATA_TIMEOUT and CircuitOpen when `endpoint` has tripped, so
+    callers can fall back to cached data. Attempts run on daemon threads — a
+    stalled request is abandoned rather than waited on.
+    """
+    circuit = breaker(endpoint)
+    if not circuit.allow():
+        raise CircuitOpen(endpoint)
+
+    results = queue.Queue()
+
+    def attempt():
+        started = time.monotonic()
+        try:
+            results.put((True, fn(), time.monotonic() - started))
+        except Exception as e:
+            results.put((False, e, time.monotonic() - started))
+
+    delay = max(LATENCY.p95(key) or HEDGE_DEFAULT_DELAY, HEDGE_MIN_DELAY)
+    deadline = time.monotonic() + MARKET_DATA_TIMEOUT
+    threading.Thread(target=attempt, daemon=True).start()
+    launched, finished, error = 1, 0, None
+
+    while finished < launched or launched < 2:
+        wait = deadline - time.monotonic()
+        if launched < 2:
+            wait = min(wait, delay)
+        try:
+            ok, value, elapsed = results.get(timeout=max(wait, 0))
+        except queue.Empty:
+            if launched < 2 and time.monotonic() < deadline:
+                threading.Thread(target=attempt, daemon=True).start()
+                launched += 1
+                continue
+            circuit.failure()
+            raise TimeoutError(f"{key}: no response after {MARKET_DATA_TIMEOUT}s")
+        finished += 1
+        if ok:
+            LATENCY.record(key, elapsed)
+            circuit.success()
+            return value
+        error = value
+        if launched < 2:
+            # First attempt failed fast — retry now instead of waiting out the delay
+            threading.Thread(target=attempt, daemon=True).start()
+            launched += 1
+
+    circuit.failure()
+    raise error
+
 
 # ═══════════════════════════════════════════════════════════════════════════
 # DATA FETCHING
 # ═══════════════════════════════════════════════════════════════════════════
 
-def fetch_market_data(ticker, yf_ticker=None):
-    """Fetch price, 52-week range, P/E, analyst targets, 1mo/3mo performance."""
-    symbol = yf_ticker or ticker
-    stock = yf.Ticker(symbol)
-    info = stock.info or {}
-
-    price = (
-        info.get("currentPrice")
-        or info.get("regularMarketPrice")
-        or info.get("navPrice")
-        or info.get("previousClose")
+QUOTE_URL = "https://query1.finance.yahoo.com/v7/finance/quote"
+QUOTE_SUMMARY_URL = "https://query2.finance.yahoo.com/v10/finance/quoteSummary/{symbol}"
+QUOTE_FIELDS = (
+    "regularMarketPrice,regularMarketPreviousClose,navPrice,"
+    "fiftyTwoWeekHigh,fiftyTwoWeekLow,trailingPE,forwardPE"
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _raw_json_session():
+    """yfinance's cookie/crumb session, or None if this yfinance lacks it.
+
+    YfData.get_raw_json is private API; when it's missing the fetchers
+    fall back to public yfinance calls (per symbol, no batching).
+    """
+    try:
+        from yfinance.data import YfData
+        session = YfData()
+    except Exception:
+        return None
+    return session if callable(getattr(session, "get_raw_json", None)) else None
+
+
+def _yahoo_json(url, params):
+    """GET a Yahoo Finance JSON endpoint through yfinance's cookie/crumb session."""
+    return _raw_json_session().get_raw_json(url, params=params, timeout=MARKET_DATA_TIMEOUT)
+
+
+def _public_quote(symbol):
+    """fetch_quotes() fallback via the public fast_info API (no P/E)."""
+    info = yf.Ticker(symbol).fast_info
+    return {
+        "price": info["lastPrice"],
+        "high_52w": info["yearHigh"],
+        "low_52w": info["yearLow"],
+        "pe_ratio": None,
+    }
+
+
+def fetch_quotes(symbols):
+    """Price, 52-week range and P/E for many symbols in one batched request."""
+    if not symbols:
+        return {}
+    if _raw_json_session() is None:
+        return {s: hedged_call(lambda s=s: _public_quote(s), s, "quote") for s in symbols}
+    params = {"symbols": ",".join(symbols), "fields": QUOTE_FIELDS}
+    key = symbols[0] if len(symbols) == 1 else "quote-batch"
+    payload = hedged_call(lambda: _yahoo_json(QUOTE_URL, params), key, "quote")
+    quotes = {}
+    for row in payload.get("quoteResponse", {}).get("result") or []:
+        quotes[row["symbol"]] = {
+            "price": row.get("regularMarketPrice") or row.get("navPrice") or row.get("regularMarketPreviousClose"),
+            "high_52w": row.get("fiftyTwoWeekHigh"),
+            "low_52w": row.get("fiftyTwoWeekLow"),
+            "pe_ratio": row.get("trailingPE") or row.get("forwardPE"),
+        }
+    return quotes
+
+
+def fetch_fundamentals(symbol):
+    """Analyst targets and consensus rating — only the financialData module."""
+    if _raw_json_session() is None:
+        info = hedged_call(lambda: yf.Ticker(symbol).info or {}, f"fundamentals:{symbol}", "fundamentals")
+        return {
+            "target_mean": info.get("targetMeanPrice"),
+            "target_low": info.get("targetLowPrice"),
+            "target_high": info.get("targetHighPrice"),
+            "analyst_recommendation": info.get("recommendationKey"),
+        }
+    url = QUOTE_SUMMARY_URL.format(symbol=symbol)
+    payload = hedged_call(
+        lambda: _yahoo_json(url, {"modules": "financialData"}),
+        f"fundamentals:{symbol}", "fundamentals",
     )
+    result = payload.get("quoteSummary", {}).get("result") or [{}]
+    fin = result[0].get("financialData") or {}
+
+    def raw(key):
+        value = fin.get(key)
+        return value.get("raw") if isinstance(value, dict) else value
+
+    return {
+        "target_mean": raw("targetMeanPrice"),
+        "target_low": raw("targetLowPrice"),
+        "target_high": raw("targetHighPrice"),
+        "analyst_recommendation": fin.get("recommendationKey"),
+    }
+
+
+def load_fundamentals():
+    """Cached fundamentals per ticker: {ticker: {fetched_at, data}}."""
+    path = CACHE_DIR / "fundamentals.json"
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def refresh_fundamentals(cache, now, due):
+    """Refetch stale fundamentals for due tickers, in a background thread.
+
+    Only tickers the fetch planner marked as due are considered, so runs
+    with the market closed never touch Yahoo. Failures are cached too and
+    retried after FUNDAMENTALS_RETRY_AFTER — ETFs and funds often have no
+    financialData at all.
 
-    hist = stock.history(period="3mo")
+    Returns (thread, updated) — `updated` is a copy of `cache` filled in as
+    fetches complete, so callers can use whatever has landed once they stop
+    waiting. `thread` is None when nothing needed refreshing.
+    """
+    updated = dict(cache)
+
+    def is_stale(entry):
+        max_age = FUNDAMENTALS_RETRY_AFTER if entry.get("error") else FUNDAMENTALS_MAX_AGE
+        return now - datetime.datetime.fromisoformat(entry["fetched_at"]) > max_age
+
+    stale = [
+        (ticker, PORTFOLIO[ticker].get("yf_ticker") or ticker)
+        for ticker in sorted(due)
+        if ticker not in cache or is_stale(cache[ticker])
+    ]
+    if not stale:
+        return None, updated
+
+    def run():
+        for ticker, symbol in stale:
+            try:
+                updated[ticker] = {"fetched_at": now.isoformat(), "data": fetch_fundamentals(symbol)}
+            except Exception as e:
+                updated[ticker] = {"fetched_at": now.isoformat(), "data": {}, "error": type(e).__name__}
+        CACHE_DIR.mkdir(exist_ok=True)
+        path = CACHE_DIR / "fundamentals.json"
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(updated, indent=2), encoding="utf-8")
+        tmp.replace(path)
+
+    # Daemon thread: a stalled fundamentals request must not hold up process exit
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread, updated
+
+
+class NoPriceData(LookupError):
+    """Raised when neither the quote nor the price history yields a price."""
+
+
+def fetch_market_data(ticker, yf_ticker=None, quote=None):
+    """Fetch price, 52-week range, P/E and 1mo/3mo performance.
+
+    Pass `quote` from a batched fetch_quotes() call to skip the per-symbol
+    quote request. Analyst targets come from the fundamentals cache instead.
+    Raises NoPriceData — counted as a "history" breaker failure — when
+    Yahoo answers but has no price, so callers fall back like any other error.
+    """
+    symbol = yf_ticker or ticker
+    if quote is None:
+        quote = fetch_quotes([symbol]).get(symbol, {})
+    price = quote.get("price")
+
+    hist = hedged_call(
+        lambda: yf.Ticker(symbol).history(period="3mo", timeout=MARKET_DATA_TIMEOUT),
+        symbol, "history",
+    )
+    if len(hist):
+        PRICE_STORE.write(symbol, hist.index.date, hist["Close"].to_numpy(),
+                          last_close(datetime.datetime.now(MARKET_TZ)).date())
     perf_1mo = None
     perf_3mo = None
 
@@ -152,24 +858,42 @@ def fetch_market_data(ticker, yf_ticker=None):
         else:
             perf_3mo = ((current - hist["Close"].iloc[0]) / hist["Close"].iloc[0]) * 100
 
+    if price is None:
+        breaker("history").failure()
+        raise NoPriceData(f"{symbol}: no price in quote or history")
+
     return {
         "price": round(price, 2) if price else None,
-        "high_52w": info.get("fiftyTwoWeekHigh"),
-        "low_52w": info.get("fiftyTwoWeekLow"),
-        "pe_ratio": info.get("trailingPE") or info.get("forwardPE"),
-        "target_mean": info.get("targetMeanPrice"),
-        "target_low": info.get("targetLowPrice"),
-        "target_high": info.get("targetHighPrice"),
-        "analyst_recommendation": info.get("recommendationKey"),
+        "high_52w": quote.get("high_52w"),
+        "low_52w": quote.get("low_52w"),
+        "pe_ratio": quote.get("pe_ratio"),
         "perf_1mo_pct": round(perf_1mo, 2) if perf_1mo is not None else None,
         "perf_3mo_pct": round(perf_3mo, 2) if perf_3mo is not None else None,
     }
 
 
 def build_portfolio_summary():
-    """Fetch data for all holdings and compute portfolio-level metrics."""
-    print("Fetching market data...")
+    """Fetch data for all holdings and compute portfolio-level metrics.
+
+    Only tickers the fetch planner marks as due hit Yahoo; the rest are served
+    from the last snapshot, so weekend and pre-market runs never touch the network.
+    """
+    now = datetime.datetime.now(MARKET_TZ)
+    snapshot = load_snapshot()
+    due = plan_fetches(now, snapshot)
+    fundamentals_thread, fundamentals = refresh_fundamentals(load_fundamentals(), now, due)
+    print(f"Fetching market data... ({len(due)} due, rest from last snapshot)")
+
+    symbols = [PORTFOLIO[t].get("yf_ticker") or t for t in due]
+    try:
+        quotes = fetch_quotes(symbols)
+    except Exception as e:
+        print(f"  Batched quote fetch failed ({e}) — falling back to price history")
+        quotes = {}
+    fetched = False
     positions = []
+    priced = []
+    fresh = []
     total_value = 0
     total_cost = 0
 
@@ -195,7 +919,25 @@ def build_portfolio_summary():
             continue
 
         try:
-            data = fetch_market_data(ticker, holding.get("yf_ticker"))
+            source = ""
+            stale_since = None
+            if ticker in due:
+                symbol = holding.get("yf_ticker") or ticker
+                try:
+                    data = fetch_market_data(ticker, symbol, quotes.get(symbol, {}))
+                except Exception as e:
+                    if ticker not in snapshot:
+                        raise
+                    # Slow or failing host — fall back to the last value we have
+                    data = snapshot[ticker]["data"]
+                    stale_since = snapshot[ticker]["fetched_at"]
+                    source = f" (STALE — {type(e).__name__})"
+                else:
+                    snapshot[ticker] = {"fetched_at": now.isoformat(), "data": data}
+                    fetched = True
+            else:
+                data = snapshot[ticker]["data"]
+                source = " (cached)"
             price = data["price"]
             if price is None:
                 print("SKIPPED (no price data)")
@@ -221,22 +963,41 @@ def build_portfolio_summary():
                 "gain_pct": round(gain_pct, 2),
                 "account": holding["account"],
             }
+            if stale_since:
+                pos["stale"] = True
+                pos["as_of"] = stale_since
             # Merge in market data (skip None values to keep JSON clean)
             for k, v in data.items():
                 if v is not None and k != "price":
                     pos[k] = round(v, 2) if isinstance(v, float) else v
 
             positions.append(pos)
-            print(f"${price:.2f}")
+            print(f"${price:.2f}{source}")
+            priced.append(pos)
+            if not source:
+                fresh.append(pos)
 
         except Exception as e:
             print(f"ERROR — {e}")
 
+    if fetched:
+        save_snapshot(snapshot)
+    LATENCY.save()
+
+    # Merge analyst targets from the fundamentals cache — whatever has landed by now
+    if fundamentals_thread:
+        fundamentals_thread.join(FUNDAMENTALS_WAIT_SECONDS)
+    for pos in priced:
+        cached = fundamentals.get(pos["ticker"])
+        for k, v in (cached or {}).get("data", {}).items():
+            if v is not None:
+                pos[k] = round(v, 2) if isinstance(v, float) else v
+
     # Calculate portfolio weights
     for pos in positions:
         pos["weight_pct"] = round((pos["market_value"] / total_value) * 100, 2) if total_value else 0
 
-    return {
+    summary = {
         "date": datetime.date.today().isoformat(),
         "total_value": round(total_value, 2),
         "total_cost": round(total_cost, 2),
@@ -246,6 +1007,428 @@ def build_portfolio_summary():
         "recurring_investments": RECURRING,
     }
 
+    if SEND_ALERTS and fresh:
+        try:
+            check_alerts(fresh, summary)
+        except Exception as e:
+            print(f"  Alerts FAILED: {e}")
+
+    return summary
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# RISK ENGINE
+# ═══════════════════════════════════════════════════════════════════════════
+
+def risk_symbol(ticker):
+    holding = PORTFOLIO.get(ticker, {})
+    return holding.get("risk_proxy") or holding.get("yf_ticker") or ticker
+
+
+def load_return_matrix(symbols, now):
+    """Daily log returns as (dates, symbols, matrix[date, symbol]), NaN before listing.
+
+    Reads from the price store. Symbols without full history — new ones,
+    ones only the daily 3mo fetch has written, or ones whose adjusted
+    closes were rescaled by a split or dividend — get it downloaded; the
+    daily fetch keeps them current after that, with a short top-up if the
+    store is behind the last close.
+    """
+    dates = PRICE_STORE.dates()
+    behind = [] if not len(dates) else [
+        s for s in symbols if PRICE_STORE.has_full_history(s)
+        and np.isnan(PRICE_STORE.closes(s, start=last_close(now).date())[1]).all()
+    ]
+    # Top up first: a top-up that finds re-adjusted closes sends the symbol to the backfill
+    for period in ("1mo", "max"):
+        group = behind if period == "1mo" else [s for s in symbols if not PRICE_STORE.has_full_history(s)]
+        if not group:
+            continue
+        try:
+            closes = yf.download(group, period=period, auto_adjust=True, progress=False,
+                                 timeout=MARKET_DATA_TIMEOUT)["Close"]
+        except Exception:
+            if period == "max":
+                raise
+            continue
+        for symbol in group:
+            if symbol in closes:
+                PRICE_STORE.write(symbol, closes.index.date, closes[symbol].to_numpy(),
+                                  last_close(now).date())
+                if period == "max":
+                    PRICE_STORE.mark_full_history(symbol)
+
+    dates, prices = PRICE_STORE.matrix(symbols)
+    traded = ~np.isnan(prices).all(axis=1)  # drop unscheduled closures (e.g. 9/11)
+    dates, prices = dates[traded], prices[traded].astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.log(prices[1:] / prices[:-1])
+    return dates[1:], symbols, returns
+
+
+def _var_cvar(returns, confidence):
+    """(VaR, CVaR) as positive loss fractions at the given confidence."""
+    cutoff = np.quantile(returns, 1 - confidence)
+    return -cutoff, -returns[returns <= cutoff].mean()
+
+
+def scenario_matrix(scenarios, dates, returns, tickers):
+    """Per-asset scenario returns, shape (scenario, asset), plus assets lacking history.
+
+    Replay windows are cumulative-sum lookups, so every scenario is computed
+    at once instead of slicing the return matrix per scenario.
+    """
+    filled = np.nan_to_num(returns)
+    cum = np.vstack([np.zeros(len(tickers)), np.cumsum(filled, axis=0)])
+    seen = np.vstack([np.zeros(len(tickers)), np.cumsum(~np.isnan(returns), axis=0)])
+
+    matrix = np.zeros((len(scenarios), len(tickers)))
+    missing = [[] for _ in scenarios]
+    replay = [i for i, sc in enumerate(scenarios) if "start" in sc]
+    if replay:
+        starts = np.searchsorted(dates, np.array([scenarios[i]["start"] for i in replay], dtype="datetime64[D]"), "right")
+        ends = np.searchsorted(dates, np.array([scenarios[i]["end"] for i in replay], dtype="datetime64[D]"), "right")
+        matrix[replay] = np.expm1(cum[ends] - cum[starts])
+        no_data = (seen[ends] - seen[starts]) == 0
+        for row, i in enumerate(replay):
+            missing[i] = [tickers[j] for j in np.flatnonzero(no_data[row])]
+    for i, sc in enumerate(scenarios):
+        if "shocks" in sc:
+            default = sc["shocks"].get("*", 0)
+            matrix[i] = [sc["shocks"].get(t, default) / 100 for t in tickers]
+    return matrix, missing
+
+
+def compute_risk(summary, now=None):
+    """Historical + bootstrapped VaR/CVaR and stress tests for the current weights."""
+    now = now or datetime.datetime.now(MARKET_TZ)
+    positions = [
+        p for p in summary["positions"]
+        if p["weight_pct"] and not PORTFOLIO.get(p["ticker"], {}).get("skip_analysis")
+    ]
+    tickers = [p["ticker"] for p in positions]
+    # Cash positions are left out of the matrix: they carry weight but no return
+    weights = np.array([p["weight_pct"] / 100 for p in positions])
+    symbols = [risk_symbol(t) for t in tickers]
+
+    dates, columns, returns = load_return_matrix(sorted(set(symbols)), now)
+    returns = returns[:, [columns.index(s) for s in symbols]]
+    total = summary["total_value"]
+
+    complete = ~np.isnan(returns).any(axis=1)
+    hist = returns[complete][-RISK_LOOKBACK_DAYS:]
+    daily = np.log1p(np.expm1(hist) @ weights)  # constant-weight portfolio log returns
+    cum = np.concatenate([[0.0], np.cumsum(daily)])
+    rng = np.random.default_rng(0)
+
+    var_rows = []
+    for h in RISK_HORIZONS:
+        if len(daily) <= h:
+            continue
+        hist_h = np.expm1(cum[h:] - cum[:-h])
+        boot_h = np.expm1(daily[rng.integers(0, len(daily), (RISK_BOOTSTRAP_PATHS, h))].sum(axis=1))
+        for c in RISK_CONFIDENCE:
+            hv, hc = _var_cvar(hist_h, c)
+            bv, bc = _var_cvar(boot_h, c)
+            var_rows.append({
+                "horizon_days": h,
+                "confidence_pct": round(c * 100),
+                "hist_var_pct": round(hv * 100, 2),
+                "hist_cvar_pct": round(hc * 100, 2),
+                "boot_var_pct": round(bv * 100, 2),
+                "boot_cvar_pct": round(bc * 100, 2),
+                "hist_var_usd": round(hv * total, 2),
+            })
+
+    # One matrix product covers every scenario; pass a (asset, portfolio)
+    # weight matrix instead of `weights` to test many portfolios at once.
+    matrix, missing = scenario_matrix(STRESS_SCENARIOS, dates, returns, tickers)
+    impact = matrix @ weights
+    contributions = matrix * weights
+    stress = []
+    for i, sc in enumerate(STRESS_SCENARIOS):
+        row = {
+            "scenario": sc["name"],
+            "portfolio_pct": round(impact[i] * 100, 2),
+            "portfolio_usd": round(impact[i] * total, 2),
+            "worst_position": tickers[int(np.argmin(contributions[i]))],
+        }
+        if missing[i]:
+            row["missing_history"] = missing[i]
+        stress.append(row)
+
+    return {
+        "history": f"{dates[complete][-len(hist)]} to {dates[-1]}" if len(hist) else None,
+        "observations": int(len(hist)),
+        "value_at_risk": var_rows,
+        "stress_tests": stress,
+    }
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# FUND LOOK-THROUGH
+# ═══════════════════════════════════════════════════════════════════════════
+
+def load_fund_holdings(directory=None):
+    """Fund constituent files as a sparse fund x security matrix (CSR arrays).
+
+    Returns a dict with funds, securities, sectors, indptr, indices, data
+    (fractions) and rows (the fund index of each stored weight). The parsed
+    matrix is cached in cache/look_through.npz and reused until a file in
+    the directory is added, removed or modified.
+    """
+    directory = Path(directory or LOOK_THROUGH_DIR)
+    files = sorted(directory.glob("*.csv"))
+    signature = json.dumps([[f.name, f.stat().st_mtime_ns, f.stat().st_size] for f in files])
+
+    path = CACHE_DIR / "look_through.npz"
+    if path.exists():
+        with np.load(path) as f:
+            if str(f["signature"]) == signature:
+                return {k: (f[k].tolist() if f[k].dtype.kind == "U" else f[k]) for k in f.files}
+
+    securities, sectors, index = [], [], {}
+    indptr, indices, data = [0], [], []
+    for file in files:
+        # utf-8-sig: Excel exports start with a BOM that would otherwise rename the "symbol" header
+        with open(file, newline="", encoding="utf-8-sig") as fh:
+            for row in csv.DictReader(fh):
+                symbol = row["symbol"].strip().upper()
+                if symbol not in index:
+                    index[symbol] = len(securities)
+                    securities.append(symbol)
+                    sectors.append((row.get("sector") or "Unknown").strip())
+                indices.append(index[symbol])
+                data.append(float(row["weight"]) / 100)
+        indptr.append(len(indices))
+
+    matrix = {
+        "funds": [f.stem.upper() for f in files],
+        "securities": securities,
+        "sectors": sectors,
+        "indptr": np.array(indptr, dtype=np.int64),
+        "indices": np.array(indices, dtype=np.int32),
+        "data": np.array(data, dtype=np.float64),
+    }
+    matrix["rows"] = np.repeat(np.arange(len(files), dtype=np.int32), np.diff(matrix["indptr"]))
+
+    CACHE_DIR.mkdir(exist_ok=True)
+    with open(path.with_suffix(".tmp"), "wb") as f:
+        np.savez(f, signature=np.array(signature),
+                 **{k: np.array(v) if isinstance(v, list) else v for k, v in matrix.items()})
+    path.with_suffix(".tmp").replace(path)
+    return matrix
+
+
+def compute_look_through(summary, matrix=None):
+    """Aggregate underlying exposure by security and sector, plus fund overlap.
+
+    Holdings with a constituent file are expanded. A holding without one
+    counts as a single name only if it appears among some fund's
+    constituents (so a direct AAPL merges with AAPL inside QQQ); anything
+    else — typically a fund with no file — is listed under
+    "not_looked_through" and kept out of top_securities.
+    """
+    matrix = matrix or load_fund_holdings()
+    funds = {name: i for i, name in enumerate(matrix["funds"])}
+    securities = matrix["securities"]
+    security_index = {sym: i for i, sym in enumerate(securities)}
+    total = summary["total_value"]
+
+    # Portfolio weight per fund, and per security held directly
+    fund_weights = np.zeros(len(funds))
+    direct = np.zeros(len(securities))
+    opaque, held = {}, []
+    for pos in summary["positions"]:
+        if PORTFOLIO.get(pos["ticker"], {}).get("skip_analysis") or not pos["weight_pct"]:
+            continue
+        name = pos["ticker"] if pos["ticker"] in funds else PORTFOLIO.get(pos["ticker"], {}).get("yf_ticker")
+        if name in funds:
+            fund_weights[funds[name]] += pos["weight_pct"] / 100
+            held.append((pos["ticker"], funds[name]))
+        elif pos["ticker"] in security_index:
+            direct[security_index[pos["ticker"]]] += pos["weight_pct"] / 100
+        else:
+            opaque[pos["ticker"]] = opaque.get(pos["ticker"], 0) + pos["weight_pct"] / 100
+
+    # Sparse matrix-vector product: exposure = holdings^T @ fund_weights
+    through_funds = np.bincount(matrix["indices"], weights=matrix["data"] * fund_weights[matrix["rows"]],
+                                minlength=len(securities))
+    exposure = through_funds + direct
+    by_symbol = {securities[i]: exposure[i] for i in np.flatnonzero(exposure)}
+
+    sector_names = sorted(set(matrix["sectors"]))
+    sector_index = np.array([sector_names.index(sec) for sec in matrix["sectors"]], dtype=np.int64)
+    by_sector = np.bincount(sector_index, weights=exposure, minlength=len(sector_names)) if len(sector_index) else []
+    unlisted = fund_weights.sum() - through_funds.sum()
+
+    # Pairwise overlap between held funds: sum of min(weight) over shared names
+    rows = {
+        ticker: dict(zip(matrix["indices"][matrix["indptr"][f]:matrix["indptr"][f + 1]].tolist(),
+                         matrix["data"][matrix["indptr"][f]:matrix["indptr"][f + 1]].tolist()))
+        for ticker, f in held
+    }
+    overlap = []
+    for i, (a, _) in enumerate(held):
+        for b, _ in held[i + 1:]:
+            shared = rows[a].keys() & rows[b].keys()
+            if shared:
+                pct = sum(min(rows[a][k], rows[b][k]) for k in shared) * 100
+                overlap.append({"funds": f"{a} / {b}", "overlap_pct": round(pct, 1)})
+    overlap.sort(key=lambda o: -o["overlap_pct"])
+
+    top = sorted(by_symbol.items(), key=lambda kv: -kv[1])[:LOOK_THROUGH_TOP_N]
+    sectors = sorted(zip(sector_names, by_sector), key=lambda kv: -kv[1])
+    if unlisted > 0.0005:
+        sectors.append(("Unlisted fund holdings", unlisted))
+    if opaque:
+        sectors.append(("Not looked through", sum(opaque.values())))
+    return {
+        "funds_looked_through": [ticker for ticker, _ in held],
+        "not_looked_through": [
+            {"ticker": ticker, "exposure_pct": round(w * 100, 2)}
+            for ticker, w in sorted(opaque.items(), key=lambda kv: -kv[1])
+        ],
+        "top_securities": [
+            {"symbol": sym, "exposure_pct": round(w * 100, 2), "exposure_usd": round(w * total, 2)}
+            for sym, w in top
+        ],
+        "sectors": [{"sector": name, "exposure_pct": round(w * 100, 2)} for name, w in sectors if w > 0],
+        "fund_overlap": overlap[:LOOK_THROUGH_TOP_N],
+    }
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# REBALANCING
+# ═══════════════════════════════════════════════════════════════════════════
+
+def account_holdings(ticker):
+    """({account: shares}, estimated) for a PORTFOLIO entry.
+
+    `estimated` is True when the entry names several accounts but gives no
+    "accounts" split, so shares were divided evenly as a guess.
+    """
+    holding = PORTFOLIO[ticker]
+    if holding.get("accounts"):
+        return dict(holding["accounts"]), False
+    names = [a.strip() for a in holding["account"].split("+")]
+    return {name: holding["shares"] / len(names) for name in names}, len(names) > 1
+
+
+def plan_rebalance(summary, targets=None):
+    """Trades that move the portfolio toward target weights, account by account.
+
+    Cash never crosses accounts, so each account funds its own buys:
+      1. This cycle's RECURRING contributions go to the most underweight
+         tickers the account can hold, instead of their usual tickers.
+         Whatever no underweight can absorb goes to the usual tickers.
+      2. Overweights are sold in tax-advantaged accounts first (Roth, then
+         tax-deferred), then taxable, lowest unrealized gain first. Each sale
+         is capped at what that account actually redeploys into underweights
+         of at least REBALANCE_MIN_TRADE, so every sale is matched by buys.
+         Sales from a guessed per-account split (no "accounts" given) are
+         capped at REBALANCE_ESTIMATED_SHARE of it and marked "estimated",
+         as are the buys they fund.
+    Greedy by largest deficit, so one pass over accounts x tickers, which
+    is cheap enough for batch runs over hundreds of holdings.
+    """
+    targets = targets or TARGET_WEIGHTS
+    prices = {p["ticker"]: p["current_price"] for p in summary["positions"]}
+    holdings = {}    # (account, ticker) -> value
+    sellable = {}    # (account, ticker) -> value that may be sold
+    estimated = set()
+    available = {}   # account -> tickers it can buy
+    for ticker in prices:
+        split, guessed = account_holdings(ticker)
+        if guessed:
+            estimated.add(ticker)
+        for account, shares in split.items():
+            holdings[(account, ticker)] = shares * prices[ticker]
+            sellable[(account, ticker)] = holdings[(account, ticker)] * (REBALANCE_ESTIMATED_SHARE if guessed else 1)
+            available.setdefault(account, set()).add(ticker)
+
+    cash = {}
+    for r in RECURRING:
+        account = r.get("account") or PORTFOLIO.get(r["ticker"], {}).get("account", "")
+        cash[account] = cash.get(account, 0) + r["amount"]
+        if r["ticker"] in prices:
+            available.setdefault(account, set()).add(r["ticker"])
+
+    total = summary["total_value"] + sum(cash.values())
+    current = {t: 0.0 for t in prices}
+    for (_, ticker), value in holdings.items():
+        current[ticker] += value
+    # Positive = underweight (needs buying), negative = overweight
+    deficit = {t: targets[t] / 100 * total - current.get(t, 0) for t in targets if t in prices}
+
+    contributions, trades = [], []
+
+    def buy(account, amount, into):
+        """Spend `amount` in `account` on its most underweight tickers."""
+        spent = 0.0
+        for ticker in sorted(available[account] & deficit.keys(), key=lambda t: -deficit[t]):
+            if amount - spent < REBALANCE_MIN_TRADE or deficit[ticker] < REBALANCE_MIN_TRADE:
+                break
+            step = min(amount - spent, deficit[ticker])
+            deficit[ticker] -= step
+            spent += step
+            into.append({"account": account, "ticker": ticker, "amount": round(step, 2)})
+        return spent
+
+    for account, amount in cash.items():
+        leftover = amount - buy(account, amount, contributions)
+        if leftover < 0.005:
+            continue
+        for r in RECURRING:
+            if (r.get("account") or PORTFOLIO.get(r["ticker"], {}).get("account", "")) != account:
+                continue
+            step = leftover * r["amount"] / amount
+            if r["ticker"] in deficit:
+                deficit[r["ticker"]] -= step
+            contributions.append({"account": account, "ticker": r["ticker"], "amount": round(step, 2)})
+
+    def sale_order(account):
+        overweight = [t for t in available[account] if deficit.get(t, 0) <= -REBALANCE_MIN_TRADE]
+        if ACCOUNT_TAX.get(account) == "taxable":
+            # Smallest unrealized gain (or biggest loss) per dollar sold first
+            return sorted(overweight, key=lambda t: 1 - PORTFOLIO[t]["avg_cost"] / prices[t])
+        return sorted(overweight, key=lambda t: deficit[t])
+
+    tax_rank = {"roth": 0, "tax_deferred": 1, "taxable": 2}
+    for account in sorted(available, key=lambda a: tax_rank.get(ACCOUNT_TAX.get(a), 2)):
+        for ticker in sale_order(account):
+            room = sum(deficit[t] for t in available[account] & deficit.keys()
+                       if deficit[t] >= REBALANCE_MIN_TRADE)
+            amount = min(-deficit[ticker], sellable.get((account, ticker), 0), room)
+            if amount < REBALANCE_MIN_TRADE:
+                continue
+            buys = []
+            amount = buy(account, amount, buys)
+            if not buys:
+                continue
+            deficit[ticker] += amount
+            sale = {"account": account, "ticker": ticker, "action": "SELL",
+                    "amount": round(amount, 2), "shares": round(amount / prices[ticker], 3)}
+            if ACCOUNT_TAX.get(account) == "taxable":
+                sale["est_realized_gain"] = round(amount * (1 - PORTFOLIO[ticker]["avg_cost"] / prices[ticker]), 2)
+            trades.append(sale)
+            for b in buys:
+                b.update(action="BUY", shares=round(b["amount"] / prices[b["ticker"]], 3))
+            if ticker in estimated:
+                for t in [sale] + buys:
+                    t["estimated"] = True
+            trades += buys
+
+    return {
+        "contribution_cycle_cash": round(sum(cash.values()), 2),
+        "contributions": contributions,
+        "trades": trades,
+        "residual_drift": [
+            {"ticker": t, "target_pct": targets[t], "after_pct": round((targets[t] / 100 * total - d) / total * 100, 2)}
+            for t, d in deficit.items() if abs(d) >= REBALANCE_MIN_TRADE
+        ],
+    }
+
 
 # ═══════════════════════════════════════════════════════════════════════════
 # CLAUDE ANALYSIS
@@ -258,7 +1441,10 @@ retirement portfolio. You are direct, data-driven, and concise.
 Given the portfolio JSON, provide:
 
 1. **Portfolio Overview** — Total value, overall P&L, concentration risks, \
-asset-class breakdown.
+asset-class breakdown. If a `look_through` section is present, use it for \
+true single-name and sector concentration and call out overlapping funds. \
+Holdings under `not_looked_through` have no constituent data — treat them \
+as unexpanded funds, not single names.
 2. **Per-Position Analysis** — For each non-cash holding give a \
 **BUY / SELL / HOLD** rating with:
    - Current price vs 52-week range and analyst targets
@@ -266,10 +1452,22 @@ asset-class breakdown.
    - Position sizing — over/underweight?
    - 2-3 sentence rationale
 3. **Recurring Investment Check** — Are the DCA amounts and frequencies \
-well-allocated given current valuations and weights?
-4. **Action Items** — Top 3 concrete, specific things to consider this week.
-
-Keep it concise and actionable. No jargon soup. Format as clean markdown.\
+well-allocated given current valuations and weights? If a `rebalance` plan \
+is present, review its trades and contribution redirects rather than inventing your own. \
+Trades marked `"estimated": true` come from a guessed per-account split — tell \
+the user to confirm that account holds the shares before acting.
+4. **Downside Risk** — If a `risk` section is present, summarize VaR/CVaR \
+and the worst stress scenarios in plain dollars, and flag positions driving them.
+5. **Action Items** — Top 3 concrete, specific things to consider this week.
+
+Positions marked `"stale": true` use the last cached price from `as_of` \
+because the live fetch timed out — say so rather than treating it as current.
+
+Keep it concise and actionable. No jargon soup. Format as clean markdown.
+
+End with one plain line (no markdown) listing every rating you gave, using \
+the tickers exactly as in the JSON:
+RATINGS: AAA=BUY, BBB=HOLD, CCC=SELL\
 """
 
 
@@ -320,14 +1518,222 @@ def save_local(report, summary):
     return path
 
 
-def deliver_email(report, summary):
-    """Send report via SMTP email."""
+CHART_VERSION = 1  # bump to invalidate cached chart images after style changes
+CHART_CACHE_KEEP = 50  # most recently used chart images kept in cache/charts/
+
+
+def _evict_charts(directory):
+    """Delete all but the CHART_CACHE_KEEP most recently used chart images."""
+    charts = sorted(directory.glob("*.png"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in charts[CHART_CACHE_KEEP:]:
+        old.unlink(missing_ok=True)
+
+
+def chart_image(kind, data):
+    """Return a PNG for a chart, rendering it only if this exact input is new.
+
+    Images live in cache/charts/ under the SHA-256 of (kind, data), so an
+    unchanged series is never re-rendered — across daily runs or across
+    portfolios that share it. A hit refreshes the file's mtime, and each new
+    render evicts down to the CHART_CACHE_KEEP most recently used images.
+    Returns None if matplotlib isn't installed.
+    """
+    key = json.dumps({"kind": kind, "data": data, "v": CHART_VERSION}, sort_keys=True)
+    path = CACHE_DIR / "charts" / f"{hashlib.sha256(key.encode()).hexdigest()}.png"
+    if path.exists():
+        path.touch()
+        return path
+
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        return None
+
+    fig, ax = plt.subplots(figsize=(7, 3.6), dpi=150)
+    if kind == "allocation":
+        labels = [d[0] for d in data]
+        ax.pie([d[1] for d in data], labels=labels, autopct="%1.1f%%",
+               startangle=90, counterclock=False, wedgeprops={"width": 0.45})
+        ax.set_title("Allocation by market value")
+        ax.axis("equal")
+    elif kind == "performance":
+        labels = [d[0] for d in data]
+        xs = range(len(data))
+        ax.bar([x - 0.2 for x in xs], [d[1] or 0 for d in data], 0.4, label="1 month")
+        ax.bar([x + 0.2 for x in xs], [d[2] or 0 for d in data], 0.4, label="3 months")
+        ax.set_xticks(list(xs), labels)
+        ax.axhline(0, color="#999999", linewidth=0.8)
+        ax.set_ylabel("Return %")
+        ax.set_title("Recent performance")
+        ax.legend(frameon=False)
+    else:
+        plt.close(fig)
+        raise ValueError(f"unknown chart kind: {kind}")
+    fig.tight_layout()
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    fig.savefig(tmp, format="png")
+    plt.close(fig)
+    tmp.replace(path)
+    _evict_charts(path.parent)
+    return path
+
+
+@functools.lru_cache(maxsize=None)
+def _docx_template():
+    from build_guide_docx import DocxTemplate
+    return DocxTemplate()
+
+
+def _add_inline(p, text):
+    """Add markdown inline text as runs: **bold** kept, *italic* and `code` markers stripped."""
+    text = text.replace("`", "")
+    for i, part in enumerate(re.split(r"\*\*", text)):
+        part = re.sub(r"\*([^*\s][^*]*)\*", r"\1", part)
+        if part:
+            p.add_run(part).bold = i % 2 == 1
+
+
+def _add_markdown_table(doc, rows):
+    """Render collected markdown table rows as a styled docx table."""
+    from build_guide_docx import set_style
+
+    cells = [
+        [c.strip() for c in row.strip().strip("|").split("|")]
+        for row in rows
+        if not re.fullmatch(r"\|?[\s:|-]+\|?", row.strip())  # header separator
+    ]
+    if not cells:
+        return
+    table = doc.add_table(rows=len(cells), cols=max(len(r) for r in cells))
+    set_style(table, "Light Grid Accent 1")
+    for r, row in enumerate(cells):
+        for c, value in enumerate(row):
+            p = table.rows[r].cells[c].paragraphs[0]
+            _add_inline(p, value if r else f"**{value.replace('**', '')}**")
+
+
+def _add_markdown(doc, text):
+    """Render Claude's markdown headings, lists, tables and **bold** into the document."""
+    from build_guide_docx import set_style
+
+    table_rows = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("|"):
+            table_rows.append(stripped)
+            continue
+        if table_rows:
+            _add_markdown_table(doc, table_rows)
+            table_rows = []
+        if not stripped or stripped == "---":
+            continue
+        heading = re.match(r"(#{1,3})\s+(.*)", stripped)
+        if heading:
+            doc.add_heading(re.sub(r"[*`]", "", heading.group(2)), level=len(heading.group(1)))
+            continue
+        p = doc.add_paragraph()
+        bullet = re.match(r"[-*]\s+(.*)", stripped)
+        numbered = re.match(r"\d+\.\s+(.*)", stripped)
+        if bullet:
+            set_style(p, "List Bullet")
+            stripped = bullet.group(1)
+        elif numbered:
+            set_style(p, "List Number")
+            stripped = numbered.group(1)
+        _add_inline(p, stripped)
+    if table_rows:
+        _add_markdown_table(doc, table_rows)
+
+
+def save_docx(report, summary):
+    """Save a .docx report — holdings table, charts and Claude's analysis."""
+    from docx.shared import Inches, Pt
+    from build_guide_docx import add_tip, set_cell_shading, set_style
+
     date = summary["date"]
-    msg = MIMEMultipart("alternative")
-    msg["Subject"] = f"Portfolio Report — {date}"
+    doc = _docx_template().new()
+    doc.add_heading(f"Portfolio Report — {date}", level=0)
+    p = doc.add_paragraph()
+    p.add_run("Total Value: ").bold = True
+    p.add_run(f"${summary['total_value']:,.2f}    ")
+    p.add_run("Total Gain/Loss: ").bold = True
+    p.add_run(f"${summary['total_gain_loss']:+,.2f} ({summary['total_gain_pct']:+.2f}%)")
+
+    # ── Holdings ──
+    doc.add_heading("Holdings", level=1)
+    positions = summary["positions"]
+    headers = ["Ticker", "Account", "Shares", "Price", "Value", "Gain/Loss", "Weight"]
+    table = doc.add_table(rows=len(positions) + 1, cols=len(headers))
+    set_style(table, "Light Grid Accent 1")
+    rows = table.rows
+    for cell, h in zip(rows[0].cells, headers):
+        cell.text = h
+        cell.paragraphs[0].runs[0].bold = True
+        set_cell_shading(cell, "D9E2F3")
+    for row, pos in zip(rows[1:], positions):
+        cells = row.cells
+        values = [
+            pos["ticker"],
+            pos["account"],
+            f"{pos['shares']:,.3f}",
+            f"${pos['current_price']:,.2f}",
+            f"${pos['market_value']:,.2f}",
+            f"{pos['gain_pct']:+.2f}%",
+            f"{pos['weight_pct']:.1f}%",
+        ]
+        for cell, value in zip(cells, values):
+            cell.text = value
+            cell.paragraphs[0].runs[0].font.size = Pt(9)
+        if pos["gain_pct"]:
+            set_cell_shading(cells[5], "E2F0D9" if pos["gain_pct"] > 0 else "FBE4E4")
+
+    stale = [pos["ticker"] for pos in positions if pos.get("stale")]
+    if stale:
+        add_tip(doc, f"Prices for {', '.join(stale)} are from the last cached fetch — the live request timed out.")
+
+    # ── Charts ──
+    charts = [
+        chart_image("allocation", [[pos["ticker"], pos["weight_pct"]] for pos in positions if pos["weight_pct"]]),
+        chart_image("performance", [
+            [pos["ticker"], pos.get("perf_1mo_pct"), pos.get("perf_3mo_pct")]
+            for pos in positions if "perf_3mo_pct" in pos
+        ]),
+    ]
+    if any(charts):
+        doc.add_heading("Charts", level=1)
+        for chart in filter(None, charts):
+            doc.add_picture(str(chart), width=Inches(6.5))
+    else:
+        print("  (charts skipped — pip install matplotlib)")
+
+    # ── Analysis ──
+    doc.add_page_break()
+    _add_markdown(doc, report)
+
+    out_dir = Path(__file__).parent / "reports"
+    out_dir.mkdir(exist_ok=True)
+    path = out_dir / f"portfolio_report_{date}.docx"
+    doc.save(path)
+    print(f"  Saved → {path}")
+    return path
+
+
+def deliver_email(report, summary, title="Portfolio Report", attachment=None):
+    """Send report via SMTP email, optionally attaching (filename, text)."""
+    date = summary["date"]
+    msg = MIMEMultipart("mixed" if attachment else "alternative")
+    msg["Subject"] = f"{title} — {date}"
     msg["From"] = EMAIL_FROM
     msg["To"] = EMAIL_TO
     msg.attach(MIMEText(report, "plain"))
+    if attachment:
+        part = MIMEText(attachment[1], "plain", "utf-8")
+        part.add_header("Content-Disposition", "attachment", filename=attachment[0])
+        msg.attach(part)
 
     with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
         server.starttls()
@@ -336,12 +1742,12 @@ def deliver_email(report, summary):
     print("  Email sent.")
 
 
-def deliver_slack(report, summary):
+def deliver_slack(report, summary, title="Portfolio Report"):
     """Post report to a Slack channel via incoming webhook."""
     import urllib.request
 
     # Slack truncates at 40k chars — trim if needed
-    text = f"*Portfolio Report — {summary['date']}*\n\n{report}"
+    text = f"*{title} — {summary['date']}*\n\n{report}"
     if len(text) > 39000:
         text = text[:39000] + "\n\n_(truncated)_"
 
@@ -354,7 +1760,7 @@ def deliver_slack(report, summary):
     print("  Slack message sent.")
 
 
-def deliver_notion(report, summary):
+def deliver_notion(report, summary, title="Portfolio Report"):
     """Create a page in a Notion database with the report."""
     import urllib.request
 
@@ -376,7 +1782,7 @@ def deliver_notion(report, summary):
     payload = json.dumps({
         "parent": {"database_id": NOTION_DATABASE_ID},
         "properties": {
-            "Name": {"title": [{"text": {"content": f"Portfolio Report — {date}"}}]},
+            "Name": {"title": [{"text": {"content": f"{title} — {date}"}}]},
             "Date": {"date": {"start": date}},
         },
         "children": children,
@@ -395,6 +1801,440 @@ def deliver_notion(report, summary):
     print("  Notion page created.")
 
 
+# ═══════════════════════════════════════════════════════════════════════════
+# DELTA REPORTS
+# ═══════════════════════════════════════════════════════════════════════════
+
+RATINGS_LINE = re.compile(r"^[`*\s]*RATINGS:(.*?)[`*\s]*$", re.MULTILINE)
+
+
+def split_ratings(report):
+    """(report, {ticker: BUY/SELL/HOLD}) from the RATINGS: line SYSTEM_PROMPT asks for.
+
+    Only that line is read — the prose mentions tickers and ratings too
+    freely to pair them reliably. The line is removed from the report.
+    Unknown tickers are ignored; no line means no ratings.
+    """
+    matches = list(RATINGS_LINE.finditer(report))
+    if not matches:
+        return report, {}
+    last = matches[-1]
+    ratings = {}
+    for ticker, rating in re.findall(r"([A-Za-z0-9.\-]+)\s*=\s*(BUY|SELL|HOLD)\b", last.group(1)):
+        if ticker.upper() in PORTFOLIO:
+            ratings[ticker.upper()] = rating
+    return (report[:last.start()] + report[last.end():]).rstrip() + "\n", ratings
+
+
+def load_last_run():
+    path = CACHE_DIR / "last_run.json"
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def save_last_run(summary, ratings, prev=None):
+    """Keep just what the next run's delta needs.
+
+    If no ratings were parsed this run (Claude left out the RATINGS line),
+    `prev`'s ratings are carried forward for tickers still held, so the
+    next run can still spot a rating flip.
+    """
+    if not ratings and prev:
+        held = {p["ticker"] for p in summary["positions"]}
+        ratings = {t: r for t, r in prev.get("ratings", {}).items() if t in held}
+    state = {
+        "date": summary["date"],
+        "total_value": summary["total_value"],
+        "positions": {
+            p["ticker"]: {"market_value": p["market_value"], "weight_pct": p["weight_pct"]}
+            for p in summary["positions"]
+        },
+        "ratings": ratings,
+    }
+    CACHE_DIR.mkdir(exist_ok=True)
+    path = CACHE_DIR / "last_run.json"
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, indent=2), encoding="utf-8")
+    tmp.replace(path)
+
+
+def compute_delta(summary, ratings, prev):
+    """What changed since `prev` (a load_last_run() state)."""
+    now = {p["ticker"]: p for p in summary["positions"]}
+    before = prev["positions"]
+    delta = {
+        "since": prev["date"],
+        "total_value_change": round(summary["total_value"] - prev["total_value"], 2),
+        "rating_changes": [
+            {"ticker": t, "from": prev["ratings"][t], "to": r}
+            for t, r in ratings.items()
+            if t in prev.get("ratings", {}) and prev["ratings"][t] != r
+        ],
+        "new_positions": sorted(now.keys() - before.keys()),
+        "removed_positions": sorted(before.keys() - now.keys()),
+        "value_moves": [],
+        "weight_drift": [],
+    }
+    for ticker in now.keys() & before.keys():
+        old, new = before[ticker], now[ticker]
+        if old["market_value"]:
+            change = (new["market_value"] - old["market_value"]) / old["market_value"] * 100
+            if abs(change) >= DELTA_VALUE_MOVE_PCT:
+                delta["value_moves"].append({
+                    "ticker": ticker,
+                    "change_pct": round(change, 2),
+                    "change_usd": round(new["market_value"] - old["market_value"], 2),
+                })
+        if abs(new["weight_pct"] - old["weight_pct"]) >= DELTA_WEIGHT_DRIFT_PP:
+            delta["weight_drift"].append(
+                {"ticker": ticker, "from_pct": old["weight_pct"], "to_pct": new["weight_pct"]})
+    delta["value_moves"].sort(key=lambda m: -abs(m["change_pct"]))
+    return delta
+
+
+def format_delta(delta, summary, report_path=None):
+    """Compact markdown for a delta — a few lines instead of the full report."""
+    change = delta["total_value_change"]
+    base = summary["total_value"] - change
+    lines = [
+        f"**Total:** ${summary['total_value']:,.2f} ({change:+,.2f} / "
+        f"{(change / base * 100) if base else 0:+.2f}% since {delta['since']})"
+    ]
+    if delta["rating_changes"]:
+        lines.append("**Rating changes:** " + ", ".join(
+            f"{c['ticker']} {c['from']} → {c['to']}" for c in delta["rating_changes"]))
+    if delta["value_moves"]:
+        lines.append("**Big moves:** " + ", ".join(
+            f"{m['ticker']} {m['change_pct']:+.1f}% ({m['change_usd']:+,.0f})" for m in delta["value_moves"]))
+    if delta["new_positions"]:
+        lines.append("**New positions:** " + ", ".join(delta["new_positions"]))
+    if delta["removed_positions"]:
+        lines.append("**Removed positions:** " + ", ".join(delta["removed_positions"]))
+    if delta["weight_drift"]:
+        lines.append("**Weight drift:** " + ", ".join(
+            f"{d['ticker']} {d['from_pct']:.1f}% → {d['to_pct']:.1f}%" for d in delta["weight_drift"]))
+    if len(lines) == 1:
+        lines.append("No rating changes or material moves.")
+    if report_path:
+        lines.append(f"_Full report: {report_path}_")
+    return "\n".join(lines)
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# ALERTS
+# ═══════════════════════════════════════════════════════════════════════════
+
+class AlertEngine:
+    """ALERT_RULES indexed by (ticker, metric), thresholds kept sorted.
+
+    A quote update bisects straight to the rules whose threshold lies
+    between the previous and new value, so the cost per update depends on
+    how many rules fire, not how many exist.
+    """
+
+    INDEXED = {
+        "price_above": ("price", "above"),
+        "price_below": ("price", "below"),
+        "gain_above": ("gain_pct", "above"),
+        "loss_below": ("gain_pct", "below"),
+        "drift_above": ("drift", "above"),
+    }
+    # Thresholds that come from the position itself: (field, direction)
+    DYNAMIC = {
+        "target_low": ("target_low", "below"),
+        "target_high": ("target_high", "above"),
+    }
+    # Yahoo's fiftyTwoWeekLow already includes today, so a new low is a price
+    # below the *previous* update's low_52w, not below the current one.
+    NEW_LOW = "new_52w_low"
+
+    def __init__(self, rules):
+        index = {}
+        self.dynamic = {}
+        for rule in rules:
+            if rule["kind"] in self.INDEXED:
+                metric, direction = self.INDEXED[rule["kind"]]
+                index.setdefault((rule["ticker"], metric, direction), []).append((rule["value"], rule))
+            elif rule["kind"] in self.DYNAMIC or rule["kind"] == self.NEW_LOW:
+                self.dynamic.setdefault(rule["ticker"], []).append(rule)
+            else:
+                raise ValueError(f"unknown alert kind: {rule['kind']}")
+        self.index = {}
+        for key, entries in index.items():
+            entries.sort(key=lambda e: e[0])
+            self.index[key] = ([e[0] for e in entries], [e[1] for e in entries])
+
+    def evaluate(self, pos, metrics, prev):
+        """Rules triggered by moving from `prev` to `metrics` (dicts of metric → value)."""
+        ticker = pos["ticker"]
+        hits = []
+        for scope in (ticker, "*"):
+            for metric, new in metrics.items():
+                if new is None:
+                    continue
+                old = prev.get(metric)
+                above = self.index.get((scope, metric, "above"))
+                if above:
+                    # prev < threshold <= new
+                    lo = bisect.bisect_right(above[0], old) if old is not None else 0
+                    hits += above[1][lo:bisect.bisect_right(above[0], new)]
+                below = self.index.get((scope, metric, "below"))
+                if below:
+                    # new <= threshold < prev
+                    hi = bisect.bisect_left(below[0], old) if old is not None else len(below[0])
+                    hits += below[1][bisect.bisect_left(below[0], new):hi]
+            for rule in self.dynamic.get(scope, ()):
+                if rule["kind"] == self.NEW_LOW:
+                    prior = prev.get("low_52w")
+                    if prior is not None and metrics["price"] < prior:
+                        hits.append(rule)
+                    continue
+                field, direction = self.DYNAMIC[rule["kind"]]
+                level, price, old = pos.get(field), metrics["price"], prev.get("price")
+                if level is None:
+                    continue
+                if direction == "below" and price <= level and (old is None or old > level):
+                    hits.append(rule)
+                elif direction == "above" and price >= level and (old is None or old < level):
+                    hits.append(rule)
+        return hits
+
+
+@functools.lru_cache(maxsize=None)
+def alert_engine():
+    return AlertEngine(ALERT_RULES)
+
+
+def _alert_message(rule, pos, metrics, prev):
+    ticker, kind = pos["ticker"], rule["kind"]
+    price = f"${metrics['price']:,.2f}"
+    if kind in ("price_above", "price_below"):
+        return f"{ticker} at {price} — crossed {'above' if kind == 'price_above' else 'below'} ${rule['value']:,.2f}"
+    if kind in ("gain_above", "loss_below"):
+        return f"{ticker} at {price} — total return {metrics['gain_pct']:+.2f}% crossed {rule['value']:+g}%"
+    if kind == "drift_above":
+        return (f"{ticker} weight {pos['weight_pct']:.2f}% vs target {TARGET_WEIGHTS[ticker]:.2f}% "
+                f"— drifted more than {rule['value']:g} points")
+    if kind == "new_52w_low":
+        return f"{ticker} at {price} — new 52-week low (prior ${prev['low_52w']:,.2f})"
+    field = kind  # target_low / target_high
+    return f"{ticker} at {price} — crossed the analyst {field.replace('_', ' ')} of ${pos[field]:,.2f}"
+
+
+def check_alerts(positions, summary, now=None):
+    """Evaluate ALERT_RULES against freshly quoted positions and deliver what fires.
+
+    Each (rule, ticker) pair fires at most once per ALERT_COOLDOWN_HOURS;
+    last-seen metric values (including the 52-week low, for new_52w_low)
+    and fire times persist in cache/alerts_state.json.
+    """
+    now = now or datetime.datetime.now(MARKET_TZ)
+    path = CACHE_DIR / "alerts_state.json"
+    try:
+        state = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        state = {"last": {}, "fired": {}}
+
+    engine = alert_engine()
+    cooldown = datetime.timedelta(hours=ALERT_COOLDOWN_HOURS)
+    messages = []
+    for pos in positions:
+        ticker = pos["ticker"]
+        metrics = {"price": pos["current_price"], "gain_pct": pos["gain_pct"]}
+        if ticker in TARGET_WEIGHTS:
+            metrics["drift"] = abs(pos["weight_pct"] - TARGET_WEIGHTS[ticker])
+        if pos.get("low_52w") is not None:
+            metrics["low_52w"] = pos["low_52w"]
+        prev = state["last"].get(ticker, {})
+        for rule in engine.evaluate(pos, metrics, prev):
+            # Also dedups a rule reached twice in one update (ticker + "*" scope)
+            rule_id = f"{ticker}:{json.dumps(rule, sort_keys=True)}"
+            last = state["fired"].get(rule_id)
+            if last and now - datetime.datetime.fromisoformat(last) < cooldown:
+                continue
+            state["fired"][rule_id] = now.isoformat()
+            messages.append(_alert_message(rule, pos, metrics, prev))
+        state["last"][ticker] = metrics
+
+    if messages:
+        print(f"  {len(messages)} alert(s) fired")
+        text = "\n".join(f"• {m}" for m in messages)
+        for channel in ALERT_CHANNELS:
+            try:
+                if channel == "slack":
+                    deliver_slack(text, summary, title="Portfolio Alert")
+                elif channel == "email":
+                    deliver_email(text, summary, title="Portfolio Alert")
+            except Exception as e:
+                print(f"  Alert {channel} FAILED: {e}")
+
+    CACHE_DIR.mkdir(exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state), encoding="utf-8")
+    tmp.replace(path)
+    return messages
+
+
+def add_analytics(summary):
+    """Add the risk, fund look-through and rebalancing sections to a summary."""
+    if RISK_ANALYSIS:
+        print("Running risk engine...")
+        try:
+            summary["risk"] = compute_risk(summary)
+            for row in summary["risk"]["value_at_risk"][:2]:
+                print(f"  {row['horizon_days']}d VaR {row['confidence_pct']}%: "
+                      f"{row['hist_var_pct']:.2f}% (${row['hist_var_usd']:,.0f})")
+            print()
+        except Exception as e:
+            print(f"  Risk FAILED: {e}\n")
+
+    if LOOK_THROUGH_DIR.is_dir():
+        try:
+            summary["look_through"] = compute_look_through(summary)
+            top = summary["look_through"]["top_securities"][:3]
+            print("  Top look-through exposures: "
+                  + ", ".join(f"{t['symbol']} {t['exposure_pct']:.1f}%" for t in top) + "\n")
+        except Exception as e:
+            print(f"  Look-through FAILED: {e}\n")
+
+    if TARGET_WEIGHTS:
+        try:
+            summary["rebalance"] = plan_rebalance(summary)
+            print(f"  Rebalance: {len(summary['rebalance']['trades'])} trade(s), "
+                  f"{len(summary['rebalance']['contributions'])} contribution redirect(s)\n")
+        except Exception as e:
+            print(f"  Rebalance FAILED: {e}\n")
+
+
+def save_summary(summary):
+    """Persist the latest enriched summary for the HTTP service."""
+    CACHE_DIR.mkdir(exist_ok=True)
+    path = CACHE_DIR / "last_summary.json"
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(summary, indent=2), encoding="utf-8")
+    tmp.replace(path)
+
+
+def load_summary():
+    path = CACHE_DIR / "last_summary.json"
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# HTTP SERVICE
+# ═══════════════════════════════════════════════════════════════════════════
+
+class ApiSnapshot:
+    """Every response body for one summary, pre-serialized with its ETag.
+
+    Snapshots are immutable; the refresher builds a new one and swaps the
+    server's reference, so readers never take a lock or wait on a fetch.
+    """
+
+    def __init__(self, summary):
+        self.created = time.time()
+        self.resources = {}
+        reports_dir = Path(__file__).parent / "reports"
+        reports = sorted(reports_dir.glob("portfolio_report_*.md"), reverse=True) if reports_dir.is_dir() else []
+        history = [
+            {"date": path.stem.rsplit("_", 1)[1], "url": f"/reports/{path.stem.rsplit('_', 1)[1]}"}
+            for path in reports
+        ]
+
+        if summary is not None:
+            self._add("/summary", summary)
+            self._add("/positions", summary["positions"])
+            for pos in summary["positions"]:
+                self._add(f"/positions/{pos['ticker'].lower()}", pos)
+        self._add("/reports", history)
+        for i, path in enumerate(reports):
+            text = path.read_text(encoding="utf-8").encode()
+            self._add(history[i]["url"], text, "text/markdown; charset=utf-8")
+            if i == 0:
+                self._add("/reports/latest", text, "text/markdown; charset=utf-8")
+
+    def _add(self, route, body, content_type="application/json"):
+        if not isinstance(body, bytes):
+            body = json.dumps(body, indent=2).encode()
+        etag = f'"{hashlib.sha1(body).hexdigest()[:20]}"'
+        self.resources[route] = (body, etag, content_type)
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    """Serves GET/HEAD from the server's current ApiSnapshot."""
+
+    def do_GET(self):
+        self._respond(send_body=True)
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+    def _respond(self, send_body):
+        route = urlsplit(self.path).path.rstrip("/").lower() or "/summary"
+        snapshot = self.server.snapshot
+        resource = snapshot.resources.get(route)
+        if resource is None:
+            body, etag, content_type = json.dumps({"error": f"not found: {route}"}).encode(), None, "application/json"
+            self.send_response(404)
+        else:
+            body, etag, content_type = resource
+            match = self.headers.get("If-None-Match", "")
+            if match.strip() == "*" or etag in (tag.strip() for tag in match.split(",")):
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-Snapshot-Age", str(int(time.time() - snapshot.created)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve():
+    """Run the local read-only API, refreshing the snapshot in the background.
+
+    Starts instantly from the last saved summary; Yahoo fetches happen only
+    on the refresher thread (and the fetch planner skips closed markets).
+    """
+    server = ThreadingHTTPServer((SERVE_HOST, SERVE_PORT), ApiHandler)
+    server.daemon_threads = True
+    server.snapshot = ApiSnapshot(load_summary())
+
+    def refresh():
+        while True:
+            try:
+                summary = build_portfolio_summary()
+                add_analytics(summary)
+                save_summary(summary)
+                server.snapshot = ApiSnapshot(summary)
+            except Exception as e:
+                print(f"  Refresh FAILED: {e}")
+            time.sleep(SERVE_REFRESH_MINUTES * 60)
+
+    threading.Thread(target=refresh, daemon=True).start()
+    print(f"Serving on http://{SERVE_HOST}:{SERVE_PORT} "
+          "(/summary, /positions/<ticker>, /reports, /reports/latest, /reports/<date>)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
 # ═══════════════════════════════════════════════════════════════════════════
 # MAIN
 # ═══════════════════════════════════════════════════════════════════════════
@@ -408,35 +2248,57 @@ def main():
     print(f"  Total cost:      ${summary['total_cost']:>12,.2f}")
     print(f"  Gain/Loss:       ${summary['total_gain_loss']:>+12,.2f} ({summary['total_gain_pct']:+.2f}%)\n")
 
+    add_analytics(summary)
+    save_summary(summary)
+
     # 2. Send to Claude for analysis
     print("Sending to Claude for analysis...")
-    report = get_claude_analysis(summary)
+    report, ratings = split_ratings(get_claude_analysis(summary))
     print("\n" + "─" * 60)
     print(report)
     print("─" * 60 + "\n")
 
-    # 3. Deliver
+    # 3. Deliver — the full report locally, only the changes elsewhere
     print("Delivering report...")
+    report_path = None
     if SAVE_LOCAL:
-        save_local(report, summary)
+        report_path = save_local(report, summary)
+    if SAVE_DOCX:
+        try:
+            save_docx(report, summary)
+        except Exception as e:
+            print(f"  DOCX FAILED: {e}")
+
+    prev = load_last_run()
+    payload, title, attachment = report, "Portfolio Report", None
+    if DELIVERY_MODE == "delta" and prev:
+        payload = format_delta(compute_delta(summary, ratings, prev), summary, report_path)
+        title = "Portfolio Changes"
+        attachment = (f"portfolio_report_{summary['date']}.md", report)
+        print(f"  Delta payload: {len(payload):,} chars (full report {len(report):,})")
+
     if SEND_EMAIL:
         try:
-            deliver_email(report, summary)
+            deliver_email(payload, summary, title=title, attachment=attachment)
         except Exception as e:
             print(f"  Email FAILED: {e}")
     if SEND_SLACK:
         try:
-            deliver_slack(report, summary)
+            deliver_slack(payload, summary, title=title)
         except Exception as e:
             print(f"  Slack FAILED: {e}")
     if POST_NOTION:
         try:
-            deliver_notion(report, summary)
+            deliver_notion(payload, summary, title=title)
         except Exception as e:
             print(f"  Notion FAILED: {e}")
+    save_last_run(summary, ratings, prev)
 
     print("\nDone.")
 
 
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        serve()
+    else:
+        main()
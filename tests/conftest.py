@@ -0,0 +1,10 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# portfolio_agent exits at import time without its dependencies
+pytest.importorskip("yfinance")
+pytest.importorskip("anthropic")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,93 @@
+import random
+
+import pytest
+
+import portfolio_agent as pa
+
+KINDS = list(pa.AlertEngine.INDEXED) + list(pa.AlertEngine.DYNAMIC) + [pa.AlertEngine.NEW_LOW]
+TICKERS = ["QQQM", "SPY", "BTC"]
+
+
+def brute_force(rules, pos, metrics, prev):
+    """Check every rule directly — the definition the bisect index must match."""
+    hits = []
+    for rule in rules:
+        if rule["ticker"] not in (pos["ticker"], "*"):
+            continue
+        if rule["kind"] == pa.AlertEngine.NEW_LOW:
+            # Yahoo's low already includes today: compare with the previous low
+            prior = prev.get("low_52w")
+            if prior is not None and metrics["price"] < prior:
+                hits.append(rule)
+            continue
+        if rule["kind"] in pa.AlertEngine.INDEXED:
+            metric, direction = pa.AlertEngine.INDEXED[rule["kind"]]
+            level, new, old = rule["value"], metrics.get(metric), prev.get(metric)
+        else:
+            field, direction = pa.AlertEngine.DYNAMIC[rule["kind"]]
+            level, new, old = pos.get(field), metrics["price"], prev.get("price")
+        if level is None or new is None:
+            continue
+        if direction == "above" and new >= level and (old is None or old < level):
+            hits.append(rule)
+        elif direction == "below" and new <= level and (old is None or old > level):
+            hits.append(rule)
+    return hits
+
+
+def random_rules(rng, n):
+    rules = []
+    for _ in range(n):
+        rule = {"ticker": rng.choice(TICKERS + ["*"]), "kind": rng.choice(KINDS)}
+        if rule["kind"] in pa.AlertEngine.INDEXED:
+            rule["value"] = rng.randint(-20, 20)  # small integer range forces ties
+        rules.append(rule)
+    return rules
+
+
+def random_metrics(rng):
+    return {
+        "price": rng.randint(-20, 20),
+        "gain_pct": rng.choice([None, rng.randint(-20, 20)]),
+        "drift": rng.choice([None, rng.randint(0, 20)]),
+        "low_52w": rng.randint(-20, 20),
+    }
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_evaluate_matches_brute_force(seed):
+    rng = random.Random(seed)
+    rules = random_rules(rng, 60)
+    engine = pa.AlertEngine(rules)
+    for _ in range(200):
+        pos = {
+            "ticker": rng.choice(TICKERS),
+            "target_low": rng.choice([None, rng.randint(-20, 20)]),
+            "target_high": rng.choice([None, rng.randint(-20, 20)]),
+        }
+        metrics = random_metrics(rng)
+        prev = {} if rng.random() < 0.1 else random_metrics(rng)
+        got = engine.evaluate(pos, metrics, prev)
+        want = brute_force(rules, pos, metrics, prev)
+        assert sorted(map(id, got)) == sorted(map(id, want))
+
+
+def test_unknown_kind_rejected():
+    with pytest.raises(ValueError):
+        pa.AlertEngine([{"ticker": "*", "kind": "volume_above", "value": 1}])
+
+
+def test_new_52w_low_fires_against_previous_low(tmp_path, monkeypatch):
+    monkeypatch.setattr(pa, "CACHE_DIR", tmp_path)
+    monkeypatch.setattr(pa, "ALERT_CHANNELS", ())
+    monkeypatch.setattr(pa, "TARGET_WEIGHTS", {})
+    monkeypatch.setattr(pa, "alert_engine", lambda: pa.AlertEngine([{"ticker": "*", "kind": "new_52w_low"}]))
+
+    def check(price, low):
+        pos = {"ticker": "SPY", "current_price": price, "gain_pct": 0.0, "low_52w": low}
+        return pa.check_alerts([pos], {}, now=pa.datetime.datetime(2026, 10, 19, 12, tzinfo=pa.MARKET_TZ))
+
+    assert check(50.0, 48.0) == []          # first look — nothing to compare with
+    # The quote's low already reflects today's trade, so price == low is the new low
+    assert check(45.0, 45.0) == ["SPY at $45.00 — new 52-week low (prior $48.00)"]
+    assert check(46.0, 45.0) == []          # bounced off the low
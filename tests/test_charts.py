@@ -0,0 +1,23 @@
+import os
+
+import pytest
+
+import portfolio_agent as pa
+
+pytest.importorskip("matplotlib")
+
+
+def test_chart_cache_keeps_most_recently_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(pa, "CACHE_DIR", tmp_path)
+    monkeypatch.setattr(pa, "CHART_CACHE_KEEP", 2)
+
+    def chart(weight):
+        return pa.chart_image("allocation", [["SPY", weight], ["QQQM", 100 - weight]])
+
+    first, second = chart(40), chart(41)
+    os.utime(first, (1, 1))
+    os.utime(second, (2, 2))
+    assert chart(40) == first          # cache hit marks it as recently used
+    third = chart(42)                  # new render evicts the least recently used
+    assert sorted(p.name for p in (tmp_path / "charts").iterdir()) == sorted([first.name, third.name])
+    assert not second.exists()
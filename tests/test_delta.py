@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+import portfolio_agent as pa
+
+
+@pytest.fixture(autouse=True)
+def portfolio(monkeypatch):
+    monkeypatch.setattr(pa, "PORTFOLIO", {"QQQM": {}, "SPY": {}, "BTC": {}})
+
+
+def summary(values, date="2026-10-19"):
+    total = sum(values.values())
+    return {
+        "date": date,
+        "total_value": total,
+        "positions": [
+            {"ticker": t, "market_value": v, "weight_pct": round(v / total * 100, 2)}
+            for t, v in values.items()
+        ],
+    }
+
+
+def test_split_ratings_reads_only_the_ratings_line():
+    report = ("## Positions\n"
+              "BUY more QQQM rather than adding to SPY, which is a HOLD.\n\n"
+              "RATINGS: QQQM=HOLD, SPY=SELL, FOO=BUY, btc=BUY\n")
+    text, ratings = pa.split_ratings(report)
+    assert ratings == {"QQQM": "HOLD", "SPY": "SELL", "BTC": "BUY"}
+    assert "RATINGS" not in text
+    assert text.endswith("which is a HOLD.\n")
+
+
+def test_split_ratings_tolerates_markdown_and_uses_last_line():
+    report = "Example: RATINGS: SPY=BUY\n\n**RATINGS: SPY=HOLD**\n`RATINGS: SPY=SELL`"
+    assert pa.split_ratings(report)[1] == {"SPY": "SELL"}
+
+
+def test_split_ratings_without_line():
+    assert pa.split_ratings("SPY: BUY") == ("SPY: BUY", {})
+
+
+def test_compute_delta():
+    prev = {
+        "date": "2026-10-16",
+        "total_value": 1000,
+        "positions": {"QQQM": {"market_value": 500, "weight_pct": 50.0},
+                      "SPY": {"market_value": 500, "weight_pct": 50.0}},
+        "ratings": {"QQQM": "BUY", "SPY": "HOLD"},
+    }
+    now = summary({"QQQM": 600, "SPY": 505, "BTC": 100})
+    delta = pa.compute_delta(now, {"QQQM": "HOLD", "SPY": "HOLD", "BTC": "BUY"}, prev)
+
+    assert delta["since"] == "2026-10-16"
+    assert delta["total_value_change"] == 205
+    assert delta["rating_changes"] == [{"ticker": "QQQM", "from": "BUY", "to": "HOLD"}]
+    assert delta["new_positions"] == ["BTC"] and delta["removed_positions"] == []
+    assert delta["value_moves"] == [{"ticker": "QQQM", "change_pct": 20.0, "change_usd": 100}]
+    # QQQM 50.0% -> 49.79% stays under DELTA_WEIGHT_DRIFT_PP; SPY 50.0% -> 41.91% doesn't
+    assert delta["weight_drift"] == [{"ticker": "SPY", "from_pct": 50.0, "to_pct": 41.91}]
+
+
+def test_missing_ratings_line_keeps_previous_ratings(tmp_path, monkeypatch):
+    monkeypatch.setattr(pa, "CACHE_DIR", tmp_path)
+    prev = {"ratings": {"QQQM": "BUY", "SPY": "HOLD", "FCNTX": "SELL"}}
+    pa.save_last_run(summary({"QQQM": 600, "SPY": 400}), {}, prev)
+    saved = json.loads((tmp_path / "last_run.json").read_text(encoding="utf-8"))
+    assert saved["ratings"] == {"QQQM": "BUY", "SPY": "HOLD"}
+
+    pa.save_last_run(summary({"QQQM": 600, "SPY": 400}), {"SPY": "SELL"}, prev)
+    saved = json.loads((tmp_path / "last_run.json").read_text(encoding="utf-8"))
+    assert saved["ratings"] == {"SPY": "SELL"}
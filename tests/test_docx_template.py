@@ -0,0 +1,36 @@
+import io
+
+import pytest
+
+docx = pytest.importorskip("docx")
+
+import build_guide_docx as bg  # noqa: E402
+from docx.oxml.ns import qn  # noqa: E402
+
+
+def base_with_tip_id(style_id):
+    doc = docx.Document()
+    bg.add_styles(doc)
+    doc.styles["Tip"].element.set(qn("w:styleId"), style_id)
+    buf = io.BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+
+def test_style_ids_stay_with_their_template():
+    first = bg.DocxTemplate(base_with_tip_id("TipA"))
+    second = bg.DocxTemplate(base_with_tip_id("TipB"))
+
+    a, b = first.new(), second.new()
+    bg.add_tip(a, "one")
+    bg.add_tip(b, "two")
+    assert a.paragraphs[-1].style.name == "Tip"
+    assert a.paragraphs[-1]._p.style == "TipA"
+    assert b.paragraphs[-1]._p.style == "TipB"
+
+
+def test_plain_document_falls_back_to_style_names():
+    doc = docx.Document()
+    bg.add_styles(doc)
+    bg.add_code_block(doc, "print(1)")
+    assert doc.paragraphs[-1].style.name == "Code Block"
@@ -0,0 +1,33 @@
+import pytest
+
+import portfolio_agent as pa
+
+
+@pytest.fixture
+def matrix(tmp_path, monkeypatch):
+    monkeypatch.setattr(pa, "CACHE_DIR", tmp_path / "cache")
+    funds = tmp_path / "funds"
+    funds.mkdir()
+    # Excel-style export with a BOM in front of the header
+    (funds / "QQQM.csv").write_text(
+        "\ufeffsymbol,weight,sector\nAAPL,40,Technology\nMSFT,35,Technology\nAMZN,20,Consumer\n",
+        encoding="utf-8")
+    return pa.load_fund_holdings(funds)
+
+
+def test_unexpanded_funds_are_not_single_names(matrix, monkeypatch):
+    monkeypatch.setattr(pa, "PORTFOLIO", {"QQQM": {}, "AAPL": {}, "FCNTX": {}})
+    summary = {"total_value": 1000, "positions": [
+        {"ticker": "QQQM", "weight_pct": 50},
+        {"ticker": "AAPL", "weight_pct": 10},   # direct, merges with AAPL inside QQQM
+        {"ticker": "FCNTX", "weight_pct": 40},  # no constituent file
+    ]}
+    result = pa.compute_look_through(summary, matrix)
+
+    top = {s["symbol"]: s["exposure_pct"] for s in result["top_securities"]}
+    assert top == {"AAPL": 30.0, "MSFT": 17.5, "AMZN": 10.0}
+    assert result["not_looked_through"] == [{"ticker": "FCNTX", "exposure_pct": 40.0}]
+    sectors = {s["sector"]: s["exposure_pct"] for s in result["sectors"]}
+    assert sectors == {"Technology": 47.5, "Consumer": 10.0,
+                       "Unlisted fund holdings": 2.5, "Not looked through": 40.0}
+    assert sum(sectors.values()) == pytest.approx(100)
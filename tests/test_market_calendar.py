@@ -0,0 +1,74 @@
+import datetime
+
+import portfolio_agent as pa
+
+TZ = pa.MARKET_TZ
+
+
+def at(*args):
+    return datetime.datetime(*args, tzinfo=TZ)
+
+
+def test_market_holidays_2026():
+    assert sorted(pa.market_holidays(2026)) == [
+        datetime.date(2026, 1, 1),
+        datetime.date(2026, 1, 19),
+        datetime.date(2026, 2, 16),
+        datetime.date(2026, 4, 3),    # Good Friday
+        datetime.date(2026, 5, 25),
+        datetime.date(2026, 6, 19),
+        datetime.date(2026, 7, 3),    # July 4 is a Saturday
+        datetime.date(2026, 9, 7),
+        datetime.date(2026, 11, 26),
+        datetime.date(2026, 12, 25),
+    ]
+
+
+def test_saturday_new_year_is_not_observed():
+    # Jan 1 2022 was a Saturday; NYSE stayed open on Dec 31 2021
+    assert datetime.date(2021, 12, 31) not in pa.market_holidays(2021)
+    assert datetime.date(2021, 12, 31) not in pa.market_holidays(2022)
+
+
+def test_juneteenth_only_from_2022():
+    assert datetime.date(2021, 6, 18) not in pa.market_holidays(2021)
+    assert datetime.date(2022, 6, 20) in pa.market_holidays(2022)
+
+
+def test_early_close():
+    _, close = pa.session_bounds(datetime.date(2026, 11, 27))
+    assert close.time() == pa.EARLY_CLOSE
+    assert pa.last_close(at(2026, 11, 28, 12)) == close
+
+
+def test_latest_data_time():
+    friday_close = at(2026, 10, 16, 16)
+    assert pa.latest_data_time("intraday", at(2026, 10, 17, 10)) == friday_close
+    assert pa.latest_data_time("intraday", at(2026, 10, 19, 8)) == friday_close
+    assert pa.latest_data_time("intraday", at(2026, 10, 19, 11)) == at(2026, 10, 19, 11)
+    assert pa.latest_data_time("nav", at(2026, 10, 19, 17)) == friday_close + pa.NAV_PUBLISH_DELAY
+    assert pa.latest_data_time("money_market", at(2026, 10, 19, 11)) is None
+
+
+def _snapshot(when):
+    return {t: {"fetched_at": when.isoformat(), "data": {}} for t in pa.PORTFOLIO}
+
+
+def test_plan_fetches_weekend_uses_snapshot():
+    assert pa.plan_fetches(at(2026, 10, 18, 10), _snapshot(at(2026, 10, 16, 20))) == set()
+
+
+def test_plan_fetches_intraday_during_session():
+    due = pa.plan_fetches(at(2026, 10, 19, 11), _snapshot(at(2026, 10, 19, 10)))
+    assert due == {t for t, h in pa.PORTFOLIO.items()
+                   if pa.instrument_cadence(t, h) == "intraday"}
+
+
+def test_plan_fetches_skips_cash_and_fetches_missing(monkeypatch):
+    monkeypatch.setattr(pa, "PORTFOLIO", {
+        "SPAXX": {"shares": 1, "avg_cost": 1, "account": "Taxable", "skip_analysis": True},
+        "VMFXX": {"shares": 1, "avg_cost": 1, "account": "Taxable", "cadence": "money_market"},
+    })
+    now = at(2026, 10, 18, 10)
+    assert pa.plan_fetches(now, {}) == {"VMFXX"}
+    assert pa.plan_fetches(now, {"VMFXX": {"fetched_at": at(2026, 1, 2).isoformat()}}) == set()
@@ -0,0 +1,55 @@
+import datetime
+
+import numpy as np
+import pytest
+
+import portfolio_agent as pa
+
+D = datetime.date
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(pa, "PRICE_STORE_START", D(2026, 9, 1))
+    return pa.PriceStore(tmp_path)
+
+
+def days(*dates):
+    return np.array(dates, dtype="datetime64[D]")
+
+
+def test_unfinished_session_is_not_stored(store):
+    store.write("SPY", days(D(2026, 10, 15), D(2026, 10, 16)), [101.0, 102.5], D(2026, 10, 15))
+    dates, closes = store.closes("SPY")
+    assert dates[-1] == np.datetime64("2026-10-15")
+    assert closes[-1] == pytest.approx(101.0)
+
+
+def test_intraday_refresh_keeps_full_history(store):
+    # Run during the 10/16 session: the live 102.5 must not be stored as a close
+    store.write("SPY", days(D(2026, 10, 14), D(2026, 10, 15), D(2026, 10, 16)),
+                [100.0, 101.0, 102.5], D(2026, 10, 15))
+    store.mark_full_history("SPY")
+    # Next run, during the 10/19 session: 10/16 closed at 103.0
+    store.write("SPY", days(D(2026, 10, 14), D(2026, 10, 15), D(2026, 10, 16), D(2026, 10, 19)),
+                [100.0, 101.0, 103.0, 103.8], D(2026, 10, 16))
+    assert store.has_full_history("SPY")
+    assert store.closes("SPY", start=D(2026, 10, 16))[1].tolist() == [103.0]
+
+
+def test_readjusted_history_drops_full_marker(store):
+    dates = days(D(2026, 10, 13), D(2026, 10, 14), D(2026, 10, 15), D(2026, 10, 16))
+    store.write("SPY", dates, [100.0, 101.0, 102.0, 103.0], D(2026, 10, 16))
+    store.mark_full_history("SPY")
+    # A 2% dividend going ex on 10/19 rescales every earlier adjusted close
+    store.write("SPY", days(*dates.tolist(), D(2026, 10, 19)),
+                [98.0, 98.98, 99.96, 100.94, 101.5], D(2026, 10, 19))
+    assert not store.has_full_history("SPY")
+
+
+def test_two_for_one_split_drops_full_marker(store):
+    dates = days(D(2026, 10, 15), D(2026, 10, 16))
+    store.write("QQQM", dates, [200.0, 202.0], D(2026, 10, 16))
+    store.mark_full_history("QQQM")
+    store.write("QQQM", days(*dates.tolist(), D(2026, 10, 19)), [100.0, 101.0, 101.6], D(2026, 10, 19))
+    assert not store.has_full_history("QQQM")
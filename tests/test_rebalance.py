@@ -0,0 +1,106 @@
+import random
+from collections import defaultdict
+
+import pytest
+
+import portfolio_agent as pa
+
+
+def setup(monkeypatch, holdings, targets, recurring=()):
+    """holdings: {ticker: {account: value}} at a $1 price, so value == shares."""
+    portfolio = {
+        ticker: {"shares": sum(accounts.values()), "avg_cost": 0.8, "account": " + ".join(accounts),
+                 "accounts": accounts}
+        for ticker, accounts in holdings.items()
+    }
+    monkeypatch.setattr(pa, "PORTFOLIO", portfolio)
+    monkeypatch.setattr(pa, "RECURRING", list(recurring))
+    monkeypatch.setattr(pa, "ACCOUNT_TAX", {"Roth IRA": "roth", "401k": "tax_deferred", "Taxable": "taxable"})
+    positions = [{"ticker": t, "current_price": 1.0} for t in holdings]
+    total = sum(sum(a.values()) for a in holdings.values())
+    return pa.plan_rebalance({"positions": positions, "total_value": total}, targets)
+
+
+def per_account(trades, action):
+    totals = defaultdict(float)
+    for t in trades:
+        if t["action"] == action:
+            totals[t["account"]] += t["amount"]
+    return totals
+
+
+def test_no_sale_without_a_buy_big_enough(monkeypatch):
+    # A is $80 overweight; B and C are each $40 under — both below the $50 minimum
+    plan = setup(monkeypatch,
+                 {"A": {"Roth IRA": 580}, "B": {"Roth IRA": 210}, "C": {"Roth IRA": 210}},
+                 {"A": 50, "B": 25, "C": 25})
+    assert plan["trades"] == []
+    assert [d["ticker"] for d in plan["residual_drift"]] == ["A"]
+
+
+def test_sale_capped_at_what_is_redeployed(monkeypatch):
+    # A is $200 overweight, B $120 under, C $80 under (both buyable)
+    plan = setup(monkeypatch,
+                 {"A": {"Roth IRA": 700}, "B": {"Roth IRA": 130}, "C": {"Roth IRA": 170}},
+                 {"A": 50, "B": 25, "C": 25})
+    sells, buys = per_account(plan["trades"], "SELL"), per_account(plan["trades"], "BUY")
+    assert sells["Roth IRA"] == pytest.approx(200)
+    assert buys["Roth IRA"] == pytest.approx(200)
+
+
+def test_leftover_contributions_go_to_usual_tickers(monkeypatch):
+    recurring = [{"ticker": "A", "amount": 300, "account": "Taxable"},
+                 {"ticker": "B", "amount": 100, "account": "Taxable"}]
+    # The only underweight (C) can't be bought in the Taxable account
+    plan = setup(monkeypatch, {"A": {"Taxable": 500}, "B": {"Taxable": 500}, "C": {"Roth IRA": 100}},
+                 {"C": 100}, recurring)
+    assert sorted((c["ticker"], c["amount"]) for c in plan["contributions"]) == [("A", 300), ("B", 100)]
+
+
+@pytest.mark.parametrize("seed", range(25))
+def test_random_plans_balance_per_account(monkeypatch, seed):
+    rng = random.Random(seed)
+    accounts = ["Roth IRA", "401k", "Taxable"]
+    tickers = [f"T{i}" for i in range(6)]
+    holdings = {
+        t: {a: rng.randint(0, 2000) for a in rng.sample(accounts, rng.randint(1, 3))}
+        for t in tickers
+    }
+    raw = [rng.random() for _ in tickers]
+    targets = {t: w / sum(raw) * 100 for t, w in zip(tickers, raw)}
+    recurring = [{"ticker": rng.choice(tickers), "amount": rng.randint(0, 500), "account": a}
+                 for a in accounts if rng.random() < 0.7]
+    plan = setup(monkeypatch, holdings, targets, recurring)
+
+    sells, buys = per_account(plan["trades"], "SELL"), per_account(plan["trades"], "BUY")
+    for account in sells.keys() | buys.keys():
+        assert sells[account] == pytest.approx(buys[account], abs=0.01 * len(plan["trades"]))
+    for t in plan["trades"]:
+        assert t["amount"] >= pa.REBALANCE_MIN_TRADE - 0.01
+        if t["action"] == "SELL":
+            assert t["amount"] <= holdings[t["ticker"]].get(t["account"], 0) + 0.01
+
+    cash = defaultdict(float)
+    for r in recurring:
+        cash[r["account"]] += r["amount"]
+    contributed = defaultdict(float)
+    for c in plan["contributions"]:
+        contributed[c["account"]] += c["amount"]
+    for account, amount in cash.items():
+        assert contributed[account] == pytest.approx(amount, abs=0.01 * len(plan["contributions"]) + 0.01)
+
+
+def test_guessed_split_sales_are_estimated_and_capped(monkeypatch):
+    # No "accounts": the 600 of A is split 300/300 across Roth IRA and Taxable by guess
+    monkeypatch.setattr(pa, "PORTFOLIO", {
+        "A": {"shares": 600, "avg_cost": 0.8, "account": "Roth IRA + Taxable"},
+        "B": {"shares": 400, "avg_cost": 0.8, "account": "Roth IRA", "accounts": {"Roth IRA": 400}},
+    })
+    monkeypatch.setattr(pa, "RECURRING", [])
+    positions = [{"ticker": "A", "current_price": 1.0}, {"ticker": "B", "current_price": 1.0}]
+    plan = pa.plan_rebalance({"positions": positions, "total_value": 1000}, {"A": 10, "B": 90})
+
+    sells = [t for t in plan["trades"] if t["action"] == "SELL"]
+    assert sells and all(t["estimated"] for t in plan["trades"])
+    cap = 300 * pa.REBALANCE_ESTIMATED_SHARE
+    assert [(t["account"], t["amount"]) for t in sells] == [("Roth IRA", cap)]